@@ -0,0 +1,172 @@
+#--------------------- IMPORTS ---------------------
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from swarm import swarm
+
+#--------------------- FUNCTIONS ---------------------
+#The state arrays of a swarm, and the shape of one parisian's row in each.
+STATE = {'position': ((2,), np.int64),
+         'theta': ((2,), np.int64),
+         'laptime': ((), np.int64),
+         'transitioning': ((), bool),
+         'inside': ((), bool),
+         'dextra': ((), bool),
+         #Which parisians path_find should move this tick.
+         'marching': ((), bool)}
+
+def share(arr):
+    '''Copies an array into a fresh block of shared memory.
+    Returns: the block, and a view of it as an array.'''
+    block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, arr.dtype, buffer=block.buf)
+    view[...] = arr
+    return block, view
+
+def describe(heatmap):
+    '''How another process can open the same heatmap without copying it.
+    A memory mapped heatmap is opened again from its file, as the pages are shared by the OS anyway,
+    anything else is copied into shared memory once.
+    Returns: (spec, block) where block is the shared memory to keep alive, or None.'''
+    if isinstance(heatmap, np.memmap) and heatmap.filename:
+        return ('file', heatmap.filename, heatmap.offset, heatmap.shape, heatmap.dtype.str), None
+    block, view = share(np.ascontiguousarray(heatmap))
+    return ('shm', block.name, 0, view.shape, view.dtype.str), block
+
+def attach(spec, blocks):
+    '''Opens an array another process described, keeping any shared memory block in blocks.'''
+    kind, name, offset, shape, dtype = spec
+    if kind == 'file':
+        return np.memmap(name, dtype, 'r', offset, shape)
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    return np.ndarray(shape, dtype, buffer=block.buf)
+
+def arrondissement(conn, heatmaps, radius, watch, shard, shards):
+    '''The loop of a worker process, walking every parisian whose index is shard modulo shards.
+    Every message carries the swarm's clock, radius and key, and names the shared state arrays,
+    so the worker can follow them when they grow or are restored.
+    Args:
+        conn : the worker's end of a pipe to the main process.
+        heatmaps : the specs of the road and building heatmaps, from describe.
+        radius, watch : as the main process's swarm.
+        shard, shards : which worker this is, and how many there are.'''
+    blocks = []
+    roads, buildings = (attach(spec, blocks) for spec in heatmaps)
+    flock = swarm(roads, buildings, radius, watch)
+    state, names = [], None
+    while True:
+        order, clock, radius, n, key, specs = conn.recv()
+        if order == 'stop':
+            break
+        if specs != names:
+            for block in state:
+                block.close()
+            state = []
+            for name, spec in specs.items():
+                setattr(flock, name, attach(spec, state))
+            names = specs
+        flock.clock = clock
+        flock.key = key
+        if radius != flock.radius:
+            flock.radius = radius
+        ours = np.arange(shard, n, shards)
+        if order == 'petrify':
+            flock.petrify(ours)
+        elif order == 'path_find':
+            flock.path_find(ours[flock.marching[ours]])
+        conn.send(order)
+    #Let go of every view before the blocks they look into.
+    del flock, roads, buildings
+    for block in state + blocks:
+        block.close()
+    conn.close()
+
+#--------------------- OBJECTS ---------------------
+class arrondissements(swarm):
+    def __init__(self, roads, buildings, radius=15, watch=50, seed=None, cones=None, shards=2):
+        '''A swarm whose parisians are shared out between worker processes, an arrondissement each, to path-find.
+        The heatmaps are opened once and shared rather than copied, and the walking state lives in shared memory,
+        so nothing but a few words passes between processes each tick. The dice each parisian rolls
+        don't depend on who rolls them, so a walk is the same as a swarm with the same seed.
+        Args: as swarm, and shards as how many worker processes to split everyone between.'''
+        self.shards = shards
+        self.blocks = {}
+        swarm.__init__(self, roads, buildings, radius, watch, seed, cones)
+        self.grow(0)
+        specs, self.heatblocks = zip(*(describe(heatmap) for heatmap in self.heatmaps))
+        #Fork where we can, so starting a worker doesn't run main.py over again.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        self.conns = []
+        self.workers = []
+        for shard in range(shards):
+            ours, theirs = context.Pipe()
+            worker = context.Process(target=arrondissement, daemon=True,
+                                     args=(theirs, specs, radius, watch, shard, shards))
+            worker.start()
+            theirs.close()
+            self.conns.append(ours)
+            self.workers.append(worker)
+
+    def grow(self, size):
+        '''Resize every state array to hold size parisians, in fresh shared memory the workers will follow.'''
+        old = getattr(self, 'blocks', {})
+        self.blocks = {}
+        for key, (shape, dtype) in STATE.items():
+            arr = np.zeros((size,) + shape, dtype)
+            if key in old:
+                prev = getattr(self, key)
+                arr[:len(prev)] = prev
+            self.blocks[key], view = share(arr)
+            setattr(self, key, view)
+        #The workers still look at the old blocks until they are next told about the new ones.
+        for block in old.values():
+            block.close()
+            block.unlink()
+        self.specs = {key: ('shm', block.name, 0, getattr(self, key).shape, getattr(self, key).dtype.str)
+                      for key, block in self.blocks.items()}
+
+    def order(self, order):
+        '''Have every worker carry out an order over their own parisians, and wait for them all.'''
+        msg = (order, self.clock, self.radius, self.live(), self.key, self.specs)
+        for conn in self.conns:
+            conn.send(msg)
+        for conn in self.conns:
+            conn.recv()
+
+    def petrify(self):
+        '''As swarm.petrify, with everyone's dice rolled in their own arrondissement.'''
+        self.order('petrify')
+        due = np.flatnonzero(self.laptime[:self.live()] == 0)
+        self.due = due
+        return due, due[~self.inside[due]]
+
+    def path_find(self, walkers):
+        '''As swarm.path_find, with everyone stepping in their own arrondissement.
+        Returns: an empty sight, as the workers keep theirs to themselves.'''
+        self.marching[:len(self.agents)] = False
+        self.marching[walkers] = True
+        self.order('path_find')
+        return self.sight[:0]
+
+    def close(self):
+        '''Stop the workers and free the shared memory.'''
+        for conn in self.conns:
+            conn.send(('stop', 0, 0, 0, None, None))
+        for worker in self.workers:
+            worker.join()
+        for key, block in self.blocks.items():
+            #Nobody may look into a block once it is gone.
+            setattr(self, key, np.array(getattr(self, key)))
+            block.close()
+            block.unlink()
+        for block in self.heatblocks:
+            if block:
+                block.close()
+                block.unlink()
+        self.blocks = {}
+        self.conns = []
+        self.workers = []
@@ -0,0 +1,194 @@
+#--------------------- IMPORTS ---------------------
+import hashlib
+import json
+import math
+import os
+import zipfile
+
+import pygame
+from PIL import Image, ImageFont, ImageDraw
+import numpy as np
+from numpy import asarray
+
+#--------------------- OBJECTS ---------------------
+class footprints:
+    def __init__(self, path='assets/foot_white.png', size=(15, 15), step=1, cache=None, cells=None, recipe=None):
+        '''An atlas of pre-rotated footprint surfaces shared by every parisian.
+        Needs the display to be set up, since the surfaces are converted for it.
+        Args:
+            path : the png of the pair of feet.
+            size : the size to scale the feet to.
+            step : the angular step in degrees between each rotation.
+            cache : an optional .npz to load the pressed feet from, or save them to.
+                It is pressed again if the feet, their size or the step have changed since.
+            cells, recipe : feet already pressed, from a snapshot, and the recipe they were pressed from.
+                They are used instead of the cache if the recipe is the same.'''
+        self.step = step
+        self.count = int(round(360 / step))
+        self.foot = Image.open(path).convert('RGBA').resize(size, Image.LANCZOS)
+        #Everything the pressed feet depend on, so we know when a cache of them is stale.
+        with open(path, 'rb') as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        self.recipe = json.dumps({'foot': digest, 'size': list(size), 'step': step})
+
+        if not self.fits(cells, recipe) and cache and os.path.exists(cache):
+            try:
+                with np.load(cache) as f:
+                    cells, recipe = f['cells'], str(f['recipe'])
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                cells = None
+        if not self.fits(cells, recipe):
+            cells = self.press()
+            if cache:
+                #Write to the side and swap it in, so a crash halfway never leaves a broken cache.
+                with open(f"{cache}.part", "wb") as f:
+                    np.savez(f, cells=cells, recipe=np.array(self.recipe))
+                os.replace(f"{cache}.part", cache)
+
+        self.cells = cells
+
+        #Left foot, right foot and double feet, one surface per angle.
+        c = cells.shape[2:4]
+        self.frames = [[pygame.image.fromstring(cells[f, k].tobytes(), c, 'RGBA').convert_alpha()
+                        for k in range(self.count)] for f in range(3)]
+
+    def fits(self, cells, recipe):
+        '''Were these feet pressed the way we would press them?'''
+        return cells is not None and recipe == self.recipe and cells.shape[:2] == (3, self.count)
+
+    def press(self):
+        '''Rotate each foot through every angle, each centred on a cell of the same size.
+        Returns: a (3, count, c, c, 4) numpy array of RGBA pixels.'''
+        feet = [self.sagent_feet(False), self.sagent_feet(True), self.foot]
+        rotas = [[asarray(foot.rotate(k * self.step, expand=True)) for k in range(self.count)] for foot in feet]
+        c = max(max(r.shape[:2]) for rota in rotas for r in rota)
+        cells = np.zeros((3, self.count, c, c, 4), np.uint8)
+        for f, rota in enumerate(rotas):
+            for k, r in enumerate(rota):
+                y, x = (c - r.shape[0]) // 2, (c - r.shape[1]) // 2
+                cells[f, k, y:y + r.shape[0], x:x + r.shape[1]] = r
+        return cells
+
+    def sagent_feet(self, dextra):
+        '''Make one of the feet transparent.
+        Args: dextra as a boolean, true to keep the right foot.
+        Returns: a PIL where either the left our right side of the image has been made transparent.'''
+        sz = self.foot.size
+        canvas = np.zeros([sz[1], sz[0], 4], dtype=np.uint8)
+        pixdata = asarray(self.foot)
+        d = math.ceil(sz[0]/2)
+        if dextra:
+            canvas[:,d:] = pixdata[:,d:]
+        else:
+            canvas[:,:d] = pixdata[:,:d]
+        return Image.fromarray(canvas)
+
+    def pick(self, theta, dextra, inside=False):
+        '''Look up the footprint facing the direction of a velocity vector.
+        Args:
+            theta : the velocity vector.
+            dextra : which foot we are on.
+            inside : if we are stopped inside, and want both feet.
+        Returns: a pygame surface.'''
+        angle = (math.atan2(theta[0], theta[1])*180/math.pi + 180) % 360
+        k = int(round(angle / self.step)) % self.count
+        return self.frames[2 if inside else int(dextra)][k]
+
+class nametags:
+    def __init__(self, font='./assets/Luminari.ttf', fnt_sz=10, pad=10, cache=None, pixels=None):
+        '''A shared font and a cache of rendered nametag surfaces, keyed by name and style.
+        Args:
+            font : the path to the truetype font.
+            fnt_sz : the size of the font.
+            pad : the padding around the name.
+            cache : an optional compressed .npz to load rendered nametags from, and save them to.
+            pixels : nametags already rendered, from a snapshot, added to any in the cache.'''
+        self.fnt = ImageFont.truetype(font, fnt_sz)
+        self.pad = pad
+        #Declare Colours
+        self.bg_fil = (245, 245, 245, 255)
+        self.txt_fil = (30, 30, 30, 255)
+        self.ln_fil = (128, 128, 128, 255)
+        self.style = (font, fnt_sz, pad, self.bg_fil, self.txt_fil, self.ln_fil)
+        self.cache = cache
+        self.surfaces = {}
+        self.pixels = {}
+        if cache and os.path.exists(cache):
+            try:
+                with np.load(cache) as f:
+                    self.pixels = self.unpack({key: f[key] for key in f.files})
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                self.pixels = {}
+        self.pixels.update(pixels or {})
+
+    def tag(self, name):
+        '''Get the nametag for a name, rendering it only the first time we see it.
+        Returns: A pygame surface.'''
+        key = (name, self.style)
+        if key not in self.surfaces:
+            if key not in self.pixels:
+                banner = self.quill(name)
+                self.pixels[key] = (banner.size, banner.tobytes())
+            size, data = self.pixels[key]
+            self.surfaces[key] = pygame.image.fromstring(data, size, 'RGBA').convert_alpha()
+        return self.surfaces[key]
+
+    def quill(self, name):
+        '''Creates a rectagular box and fills it with the name.
+        Returns: A PIL png image.'''
+        pad = self.pad
+        #Get size based on length of name
+        fnt_bbox = self.fnt.getbbox(name)
+        fnt_box = fnt_bbox[2] + pad, fnt_bbox[3] + math.ceil(pad/2)
+        #Get top left corner
+        fnt_ach = (math.ceil(pad/2), math.ceil(pad/4))
+
+        #Create Background
+        banner = Image.new(mode="RGBA", size=(fnt_box), color=self.bg_fil)
+        #Create Text
+        pencil = ImageDraw.Draw(banner)
+        pencil.text(fnt_ach, name, font=self.fnt, fill=self.txt_fil)
+        #Create Border
+        bdr_wth = math.floor(pad/4)
+        bdr_top = (0, 0, fnt_box[0] - bdr_wth, 0)
+        bdr_btm = (0, fnt_box[1] - bdr_wth, fnt_box[0] - bdr_wth, fnt_box[1] - bdr_wth)
+        bdr_lft = (0, 0, 0, fnt_box[1] - bdr_wth)
+        bdr_rgt = (fnt_box[0] - bdr_wth, 0, fnt_box[0] - bdr_wth, fnt_box[1] - bdr_wth)
+        pencil.line(bdr_top, fill=self.ln_fil, width=bdr_wth)
+        pencil.line(bdr_btm, fill=self.ln_fil, width=bdr_wth)
+        pencil.line(bdr_lft, fill=self.ln_fil, width=bdr_wth)
+        pencil.line(bdr_rgt, fill=self.ln_fil, width=bdr_wth)
+
+        return banner
+
+    def pack(self, names=None):
+        '''The nametags rendered in the current style, packed end to end, for np.savez.
+        Args: names as the names to pack, or None for every one we have.
+        Returns: a dictionary of the style, names, sizes and pixels as numpy arrays.'''
+        tags = [(name, *self.pixels[(name, style)]) for name, style in sorted(self.pixels)
+                if style == self.style and (names is None or name in names)]
+        return {'style': np.array(json.dumps(self.style)),
+                'names': np.array([name for name, _, _ in tags], dtype=str),
+                'sizes': np.array([size for _, size, _ in tags], np.int64).reshape(-1, 2),
+                'pixels': np.frombuffer(b''.join(data for _, _, data in tags), np.uint8)}
+
+    @staticmethod
+    def unpack(packed):
+        '''Undoes pack.
+        Returns: a dictionary of (name, style) : (size, RGBA bytes), as nametags.pixels.'''
+        #json makes lists of the colour tuples, and the nametags are keyed on tuples.
+        style = tuple(tuple(v) if isinstance(v, list) else v for v in json.loads(str(packed['style'])))
+        pixels, offset = {}, 0
+        for name, (w, h) in zip(packed['names'], packed['sizes']):
+            pixels[(str(name), style)] = ((int(w), int(h)), packed['pixels'][offset:offset + w * h * 4].tobytes())
+            offset += w * h * 4
+        return pixels
+
+    def save(self):
+        '''Write every nametag rendered so far in the current style to the cache file, if we have one.
+        The nametags are mostly flat colour, so they compress to a few percent of their size.'''
+        if not self.cache:
+            return
+        with open(f"{self.cache}.part", "wb") as f:
+            np.savez_compressed(f, **self.pack())
+        os.replace(f"{self.cache}.part", self.cache)
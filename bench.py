@@ -0,0 +1,193 @@
+#--------------------- IMPORTS ---------------------
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+#No window, no monitor: the dummy driver gives us a display surface that lives only in memory.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+import numpy as np
+
+from city import paris, ville
+from chrono import chrono
+from horloge import horloge
+from gouverneur import gouverneur
+from maps.vinegar import brine, uncork
+
+#--------------------- WORLD ---------------------
+def lay_out(size, block=230, street=30, setback=20):
+    '''A synthetic city on a grid: streets every block, with a building set back inside each block.
+    Args:
+        size : the width and height of the map in pixels.
+        block : the distance between streets.
+        street : how wide each street is.
+        setback : the gap between a street and the building beside it.
+    Returns: the road and building heatmaps as 2d uint8 arrays, like the ones cartographer.py draws.'''
+    a = np.arange(size) % block
+    road = a < street
+    built = (a >= street + setback) & (a < block - setback)
+    roads = np.where(road[:, None] | road[None, :], 255, 0).astype(np.uint8)
+    buildings = np.where(built[:, None] & built[None, :], 85, 0).astype(np.uint8)
+    return roads, buildings
+
+def tile_out(roads, buildings, folder, tile_size=(920, 920), name='Bench'):
+    '''Colours the heatmaps in and cuts them into tiles, named like sizzors.py names them.'''
+    os.makedirs(folder, exist_ok=True)
+    tw, th = tile_size
+    for row in range(math.ceil(roads.shape[0] / th)):
+        for col in range(math.ceil(roads.shape[1] / tw)):
+            r = roads[th*row:th*(row+1), tw*col:tw*(col+1)].astype(np.uint16)
+            b = buildings[th*row:th*(row+1), tw*col:tw*(col+1)].astype(np.uint16)
+            rgb = np.stack([60 + r * 3 // 4, 60 + r * 3 // 4 + b, 70 + r * 3 // 4], axis=-1).clip(0, 255)
+            surf = pygame.surfarray.make_surface(rgb.astype(np.uint8).swapaxes(0, 1))
+            pygame.image.save(surf, os.path.join(folder, f"{name}_{row}_{col}.png"))
+
+def survey(folder, size, tile_size=(920, 920)):
+    '''Builds a synthetic world in a folder: memory mapped heatmaps and a folder of tiles.
+    Returns: the road and building heatmaps as memmaps, and the tile folder.'''
+    roads, buildings = lay_out(size)
+    brine(roads, os.path.join(folder, 'heatmap_roads'))
+    brine(buildings, os.path.join(folder, 'heatmap_buildings'))
+    tile_out(roads, buildings, os.path.join(folder, 'tiles'), tile_size)
+    return uncork(os.path.join(folder, 'heatmap_roads')), uncork(os.path.join(folder, 'heatmap_buildings')), os.path.join(folder, 'tiles')
+
+#--------------------- BENCHMARK ---------------------
+def peak_rss():
+    '''The most memory this process has held, in bytes.'''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Linux reports kilobytes, macOS bytes.
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def bench(agents=1000, ticks=600, size=4600, view=(768, 432), seed=0, trails=True, dirty=True, pan=0., folder=None,
+          profile=None, shards=0, pace=None, govern=None):
+    '''Runs the real town for a number of ticks as fast as it will go, without a window.
+    Args:
+        agents : how many parisians to walk around.
+        ticks : how many frames to run for.
+        size : the width and height of the synthetic map.
+        view : the width and height of the camera.
+        seed : seeds the spawn points, clocks and the swarm, so every run walks the same.
+        trails, dirty : as in main.py.
+        pan : how many pixels a frame the camera circles around the middle of the map, 0 to keep it still.
+        folder : where to build the world, a temporary folder by default.
+        profile : a chrono to time each phase of every tick with, reported along with the results.
+        shards : how many worker processes to path-find in, 0 for none.
+        pace : a horloge to pace the simulation with, one tick a frame by default.
+        govern : a frame rate for a gouverneur to hold by turning quality up and down, None to leave it be.
+    Returns: a dictionary of the results.'''
+    random.seed(seed)
+    pygame.init()
+    display = pygame.display.set_mode(view)
+
+    #Keep the chatter of the town out of the results.
+    with tempfile.TemporaryDirectory() as scratch, contextlib.redirect_stdout(sys.stderr):
+        folder = folder or scratch
+        t = time.perf_counter()
+        roads, buildings, tiles = survey(folder, size)
+        built = time.perf_counter() - t
+
+        #Put the middle of the map in the middle of the camera.
+        i, j = view[0] / 2 - size / 2, view[1] / 2 - size / 2
+        t = time.perf_counter()
+        Map = paris(i, j, view, folder=tiles, dim=(size, size))
+        town = ville(display, Map, roads, buildings, trails, dirty, seed=seed,
+                     tags=os.path.join(folder, 'nametags.npz'), profile=profile, shards=shards, pace=pace)
+        with open('assets/FrenchName_Database.json') as f:
+            data = json.load(f)
+        for _ in range(agents):
+            agent = data[random.randint(0, len(data) - 1)]
+            town.enlist(agent['name'], Map.get_random_pos(), agent['id'])
+        governor = gouverneur(town, govern, os.path.join(folder, 'quality.json')) if govern else None
+        loaded = time.perf_counter() - t
+
+        #Time each tick on its own, so a slow one stands out from the average.
+        times = np.zeros(ticks)
+        for tick in range(ticks):
+            if pan:
+                a = tick * 2 * math.pi / 600
+                i, j = Map.lock_in_bounds(i + pan * math.cos(a), j + pan * math.sin(a), i, j)
+            t = time.perf_counter()
+            with town.profile.scope('events'):
+                pygame.event.pump()
+            rects = town.tick(i, j)
+            with town.profile.scope('display.update'):
+                pygame.display.update(rects)
+            times[tick] = time.perf_counter() - t
+            town.profile.frame()
+            if governor:
+                governor.watch(times[tick] * 1e3)
+        town.close()
+    pygame.quit()
+
+    total = times.sum()
+    report = {
+        'agents': agents,
+        'ticks': ticks,
+        'size': size,
+        'view': list(view),
+        'seed': seed,
+        'trails': trails,
+        'dirty': dirty,
+        'pan': pan,
+        'shards': shards,
+        'build_secs': round(built, 3),
+        'load_secs': round(loaded, 3),
+        'run_secs': round(total, 3),
+        'ticks_per_sec': round(ticks / total, 2),
+        'tick_ms': {q: round(float(np.percentile(times, p)) * 1e3, 3) for q, p in (('p50', 50), ('p95', 95), ('max', 100))},
+        'agent_step_us': round(total / ticks / max(agents, 1) * 1e6, 3),
+        'peak_rss_bytes': peak_rss(),
+    }
+    report['pace'] = town.pace.report()
+    if governor:
+        report['quality'] = governor.report()
+    if profile is not None:
+        report['profile'] = profile.report()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run Little Paris headless over a synthetic world and report how fast it goes.')
+    parser.add_argument('--agents', type=int, default=1000, help='how many parisians to walk around')
+    parser.add_argument('--ticks', type=int, default=600, help='how many frames to run for')
+    parser.add_argument('--size', type=int, default=4600, help='the width and height of the synthetic map')
+    parser.add_argument('--view', type=int, nargs=2, default=(768, 432), help='the width and height of the camera')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the spawn points, clocks and the swarm')
+    parser.add_argument('--ghosts', action='store_true', help='a ghost per footprint instead of the footpath')
+    parser.add_argument('--full', action='store_true', help='repaint the whole screen every frame')
+    parser.add_argument('--pan', type=float, default=0., help='pixels a frame the camera circles at')
+    parser.add_argument('--folder', default=None, help='where to build the world, a temporary folder by default')
+    parser.add_argument('--shards', type=int, default=0, help='how many worker processes to path-find in, 0 for none')
+    parser.add_argument('--rate', type=int, default=None, help='ticks of simulation a second, one a frame by default')
+    parser.add_argument('--budget', type=float, default=10, help='ms a frame may spend on simulation when paced by --rate')
+    parser.add_argument('--govern', type=float, default=None, help='a frame rate to hold by turning quality up and down')
+    parser.add_argument('--profile', action='store_true', help='time each phase of every tick and report the percentiles')
+    parser.add_argument('--trace', default=None, help='a file to write a Chrome trace of the phases to, implies --profile')
+    parser.add_argument('--out', default=None, help='a file to write the results to, as well as printing them')
+    args = parser.parse_args()
+
+    #The assets are found relative to the repository, wherever we were run from.
+    out = args.out and os.path.abspath(args.out)
+    folder = args.folder and os.path.abspath(args.folder)
+    trace = args.trace and os.path.abspath(args.trace)
+    #Keep every timing of a short run for the trace.
+    profile = chrono(window=args.ticks, events=10**6) if args.profile or trace else None
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    report = bench(args.agents, args.ticks, args.size, tuple(args.view), args.seed,
+                   not args.ghosts, not args.full, args.pan, folder, profile, args.shards,
+                   horloge(args.rate, args.budget), args.govern)
+    if trace:
+        profile.trace(trace)
+    text = json.dumps(report, indent=2)
+    if out:
+        with open(out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
@@ -0,0 +1,161 @@
+#--------------------- IMPORTS ---------------------
+import json
+import time
+from collections import deque
+
+import pygame
+import numpy as np
+
+#--------------------- OBJECTS ---------------------
+class lap:
+    def __init__(self, watch, name, idx=None):
+        '''Times one pass through a phase of the frame, for a chrono.
+        Args:
+            watch : the chrono to report to.
+            name : the name of the phase.
+            idx : the parisian being timed, if this is a sample of a single one.'''
+        self.watch = watch
+        self.name = name
+        self.idx = idx
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.watch.record(self.name, self.start, time.perf_counter(), self.idx)
+        return False
+
+class idle:
+    '''Stands in for a lap when the chrono is off, so timing a phase costs next to nothing.'''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class chrono:
+    #Every chrono that is off hands out the same lap that does nothing.
+    idle = idle()
+
+    def __init__(self, on=True, window=240, every=16, events=200000, refresh=30):
+        '''Times the phases of each frame and keeps a rolling window of how long each took, so a dropped frame
+        can be pinned on the phase that caused it.
+        Args:
+            on : False to time nothing at all.
+            window : how many frames the percentiles are taken over.
+            every : one in every this many parisians is timed on their own each frame, in turn.
+            events : how many timings to keep for a trace, the oldest are dropped first.
+            refresh : how many frames between redrawing the overlay.'''
+        self.on = on
+        self.window = window
+        self.every = every
+        self.refresh = refresh
+        #phase : the time spent in it each of the last few frames.
+        self.phases = {}
+        #phase : the time a single parisian spent in it, for the last few that were sampled.
+        self.agents = {}
+        self.current = {}
+        self.events = deque(maxlen=events)
+        self.origin = time.perf_counter()
+        #When the first phase of this frame started.
+        self.opened = None
+        self.count = 0
+        #The overlay, drawn over the top of everything when hud is True.
+        self.hud = False
+        self.font = None
+        self.overlay = None
+        self.shown = None
+
+    def scope(self, name):
+        '''Time a phase of the frame. Use it as a context manager, a phase can be timed more than once a frame.
+        Args: name as the name of the phase.'''
+        return lap(self, name) if self.on else self.idle
+
+    def sample(self, name, idx):
+        '''Time a single parisian's part in a phase, if it is their turn to be sampled this frame.
+        Args:
+            name : the name of the phase.
+            idx : the parisian's index in the swarm.'''
+        if self.on and idx % self.every == self.count % self.every:
+            return lap(self, name, idx)
+        return self.idle
+
+    def record(self, name, start, end, idx=None):
+        '''Keep a timing, both for the percentiles and the trace.'''
+        if self.opened is None:
+            self.opened = start
+        event = {'name': name, 'ph': 'X', 'ts': round((start - self.origin) * 1e6, 1),
+                 'dur': round((end - start) * 1e6, 1), 'pid': 0, 'tid': 0}
+        if idx is None:
+            self.current[name] = self.current.get(name, 0.) + end - start
+        else:
+            self.agents.setdefault(name, deque(maxlen=self.window * 4)).append(end - start)
+            event['tid'] = 1
+            event['args'] = {'idx': int(idx)}
+        self.events.append(event)
+
+    def frame(self):
+        '''Close off a frame, pushing the time spent in each phase onto the rolling window.'''
+        if not self.on:
+            return
+        now = time.perf_counter()
+        self.current['frame'] = now - (self.opened or now)
+        self.events.append({'name': 'frame', 'ph': 'i', 's': 'g', 'ts': round((now - self.origin) * 1e6, 1), 'pid': 0, 'tid': 0})
+        #A phase we skipped this frame still took no time, which matters to its percentiles.
+        for name in self.phases.keys() | self.current.keys():
+            self.phases.setdefault(name, deque(maxlen=self.window)).append(self.current.get(name, 0.))
+        self.current = {}
+        self.opened = None
+        self.count += 1
+
+    def report(self):
+        '''Percentiles of the rolling window.
+        Returns: a dictionary of each phase's percentiles per frame in ms, and the samples per parisian in µs.'''
+        def spread(times, scale):
+            times = np.asarray(times) * scale
+            return {'p50': round(float(np.percentile(times, 50)), 3),
+                    'p95': round(float(np.percentile(times, 95)), 3),
+                    'p99': round(float(np.percentile(times, 99)), 3),
+                    'max': round(float(times.max()), 3),
+                    'mean': round(float(times.mean()), 3)}
+        return {'frames': self.count,
+                'phases_ms': {name: spread(times, 1e3) for name, times in self.phases.items() if times},
+                'agent_us': {name: spread(times, 1e6) for name, times in self.agents.items() if times}}
+
+    def dump(self, path):
+        '''Write the percentiles as json.'''
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def trace(self, path):
+        '''Write every timing still kept as a Chrome trace, to open in chrome://tracing or Perfetto.'''
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}, f)
+
+    def draw(self, surface):
+        '''Draw the overlay in the top left corner, the slowest phases first.
+        Returns: the rect drawn over, or None if the overlay is off.'''
+        if not (self.on and self.hud and self.phases):
+            return None
+        if self.overlay is None or self.count % self.refresh == 0:
+            if self.font is None:
+                self.font = pygame.font.Font(None, 16)
+            phases = self.report()['phases_ms']
+            rows = [('phase', 'p50', 'p95')]
+            rows += [(name, f"{p['p50']:.2f}", f"{p['p95']:.2f}")
+                     for name, p in sorted(phases.items(), key=lambda kv: -kv[1]['p95'])]
+            #Each column is rendered on its own and lined up, so the overlay reads well in any font.
+            texts = [[self.font.render(cell, True, (255, 255, 255)) for cell in row] for row in rows]
+            widths = [max(row[k].get_width() for row in texts) + 8 for k in range(3)]
+            h = self.font.get_linesize()
+            self.overlay = pygame.Surface((sum(widths) + 8, h * len(texts) + 8))
+            self.overlay.fill((0, 0, 0))
+            for n, row in enumerate(texts):
+                x = 4
+                for k, text in enumerate(row):
+                    #The name is lined up on the left, the numbers on the right.
+                    self.overlay.blit(text, (x if k == 0 else x + widths[k] - 8 - text.get_width(), 4 + n * h))
+                    x += widths[k]
+        self.shown = surface.blit(self.overlay, (0, 0))
+        return self.shown
@@ -0,0 +1,730 @@
+#--------------------- IMPORTS ---------------------
+import json
+import math
+import random
+
+import pygame
+from PIL import Image
+import numpy as np
+from numpy import asarray
+
+from swarm import swarm
+from arrondissement import arrondissements
+from atlas import footprints, nametags
+from trail import trail
+from tiles import tileset, prefetcher
+from quartier import quartier
+from cortege import cortege
+from chrono import chrono
+from horloge import horloge
+
+#--------------------- GLOBALS ---------------------
+#The paris every sprite is drawn through, and the display they are drawn onto. A ville sets them up.
+Map = None
+gameDisplay = None
+
+#--------------------- OBJECTS ---------------------
+class parisian(pygame.sprite.DirtySprite):
+    #The atlas of pre-rotated footprints, shared by everyone once the display exists.
+    feet = None
+    #The grid of where everyone is on the map, so we only look after the parisians near the camera.
+    grid = None
+
+    def __init__(self, name, pos, time, flock):
+        pygame.sprite.DirtySprite.__init__(self)
+        self.name = name
+        #The swarm holds our walking state, and where we are on the map; we just read back the results.
+        self.flock = flock
+        self.idx = flock.enlist(self, (int(pos[0]), int(pos[1])), time)
+        self.grid.place(self, self.position)
+        self.image = self.dancing_feet()
+        self.rect = self.image.get_rect()
+
+    @property
+    def position(self):
+        return tuple(int(p) for p in self.flock.position[self.idx])
+
+    @property
+    def laptime(self):
+        return int(self.flock.laptime[self.idx])
+
+    @property
+    def radius(self):
+        return self.flock.radius
+
+    @property
+    def theta(self):
+        return tuple(int(t) for t in self.flock.theta[self.idx])
+
+    @property
+    def dextra(self):
+        return bool(self.flock.dextra[self.idx])
+
+    @property
+    def inside(self):
+        return bool(self.flock.inside[self.idx])
+
+    @property
+    def transitioning(self):
+        return bool(self.flock.transitioning[self.idx])
+
+    def update(self):
+        rect = self.image.get_rect(center=Map.toscreen(self.position))
+        #Only ask to be redrawn if we have actually moved on screen.
+        if rect != self.rect:
+            self.rect = rect
+            self.dirty = 1
+
+    def dancing_feet(self):
+        '''Pick the rotated and cropped footprints of the parisian from the atlas'''
+
+        #We use the foot we are on, depending on self.dextra, facing the vector we are currently using.
+        #However, if we are inside, then we are going to be stopped, and we can use double feet.
+        self.image = self.feet.pick(self.theta, self.dextra, self.inside)
+        self.dirty = 1
+        return self.image
+
+    def locomotor(self):
+        '''In this function, the parisian catches up with the step the swarm took for them.
+        The choice is based on the brightest pixel returned by swarm.path_find, which is now our theta.'''
+        self.grid.place(self, self.position)
+        return self.position
+
+    def reveal(self, path_find):
+        surf = pygame.surfarray.make_surface(path_find);
+        x, y = Map.toscreen(self.position)
+        gameDisplay.blit(surf, (x - self.radius, y - self.radius))
+
+
+    def geminio(self):
+        '''Create a snapshot of this instance's key property to pass to other classes.
+        Returns: A list of properties.'''
+        return [self.rect,
+                self.feet.sagent_feet(self.dextra),
+                self.position, 
+                self.laptime, 
+                self.theta, 
+                self.dextra]
+
+class ghost(pygame.sprite.DirtySprite):
+    #The grid of where every ghost is on the map.
+    grid = None
+
+    def __init__(self, rect, png, position, time, theta, dextra):
+        pygame.sprite.DirtySprite.__init__(self)
+        self.position = position
+        self.theta = theta
+        self.dextra = dextra
+        self.png = png
+        self.alpha = 1.
+        self.image = self.dispart(self.png.copy())
+        self.rect = rect
+        self.watch = 90
+        self.laptime = time
+
+    def update(self):
+        rect = self.image.get_rect(center=Map.toscreen(self.position))
+        if rect != self.rect:
+            self.rect = rect
+            self.dirty = 1
+        self.laptime = (self.laptime + 1) % self.watch
+        self.end_self()
+
+    def dispart(self, pix):
+        '''Reduce the alpha value of the image by a specified value
+        Args: pix which is a PIL Image.
+        Returns: a pygame surface with a reduced alpha channel.'''
+        self.alpha = self.alpha * 0.99
+
+        #Reduce Alpha
+        pixdata = asarray(pix)
+        pixdata = pixdata * self.alpha
+        pix = Image.fromarray(pixdata.astype(np.uint8))
+        return pix
+
+    def sedate(self):
+        '''Rotate and crop the footprints of the parisian'''
+
+        #Now we rotate that foot in the direction of the vector we are currently using.
+        angle = int(round((math.atan2(self.theta[0], self.theta[1])*180/math.pi + 180) % 360, 0))
+        rota = self.png.copy().rotate(angle, expand=True)
+
+        #In the ghost class, we want to reduce the alpha chanel over frames.
+        seethru = self.dispart(rota)
+
+        #We have a single, rotated foot as a png. 
+        #Now we need to convert that into a pygame surface for our sprite.
+        mode = seethru.mode
+        size = seethru.size
+        data = seethru.tobytes()
+        self.image = pygame.image.fromstring(data, size, mode).convert_alpha()
+        self.dirty = 1
+        return self.image
+
+    def linger(self):
+        '''Fade away off screen, without the cost of drawing a faded foot nobody will see'''
+        self.alpha = self.alpha * 0.99
+        self.end_self()
+
+    def end_self(self):
+        '''Sends this instance of the sprite to the garbage, freeing the computers memory'''
+        if self.alpha <= 0.15:
+            self.kill()
+            self.grid.remove(self)
+
+class portrait(pygame.sprite.DirtySprite):
+    #The font and nametags, shared by everyone once the display exists.
+    tags = None
+    #The grid of where every nametag is on the map.
+    grid = None
+    #Where every nametag is and who it follows, so they can all seek at once.
+    cortege = None
+
+    def __init__(self, agent):
+        pygame.sprite.DirtySprite.__init__(self)
+        #We are bound to our parisian, not to wherever they happen to be in a list.
+        self.agent = agent
+        self.name = agent.name
+        self.idx = self.cortege.enlist(self, agent)
+        self.image = self.tags.tag(self.name)
+        self.rect = self.image.get_rect()
+
+    @property
+    def position(self):
+        return tuple(int(p) for p in self.cortege.position[self.idx])
+
+    @property
+    def laptime(self):
+        return int(self.cortege.laptime[self.idx])
+
+    @property
+    def watch(self):
+        return self.cortege.watch
+
+    @property
+    def throttle(self):
+        return self.cortege.throttle
+
+    def update(self):
+        rect = self.image.get_rect(center=Map.toscreen(self.position))
+        if rect != self.rect:
+            self.rect = rect
+            self.dirty = 1
+
+    def kill(self):
+        '''Leave every group, the grid and the cortege, so nobody else loses their parisian.'''
+        pygame.sprite.DirtySprite.kill(self)
+        if self.idx is not None:
+            self.grid.remove(self)
+            self.cortege.dismiss(self)
+
+class stage(pygame.sprite.LayeredDirty):
+    def __init__(self, background):
+        '''The sprites near the camera, which redraws only the parts of the screen that have changed.
+        Args: background as the surface to restore behind anything that moves.'''
+        pygame.sprite.LayeredDirty.__init__(self)
+        self.clear(None, background)
+
+    def cast(self, *troupes):
+        '''Keep the stage to just these sprites, so anyone who has wandered off is swept away.
+        Args: troupes as lists of sprites, each on its own layer, drawn bottom to top.'''
+        wanted = {}
+        for layer, troupe in enumerate(troupes):
+            for sprite in troupe:
+                wanted[sprite] = layer
+        self.remove([sprite for sprite in self.sprites() if sprite not in wanted])
+        for sprite, layer in wanted.items():
+            if not self.has(sprite):
+                self.add(sprite, layer=layer)
+
+    def draw(self, surface):
+        '''Draw whatever has changed, and return the rects of the screen to update.'''
+        #Anything see-through redrawn into two overlapping rects would be blended twice, so merge them first.
+        merged = []
+        for rect in self.lostsprites:
+            rect = pygame.Rect(rect)
+            k = rect.collidelist(merged)
+            while k > -1:
+                rect.union_ip(merged.pop(k))
+                k = rect.collidelist(merged)
+            merged.append(rect)
+        self.lostsprites[:] = merged
+        return pygame.sprite.LayeredDirty.draw(self, surface)
+
+class paris:
+    def __init__(self, i, j, view, budget=128 * 2**20, workers=2, folder='tiles', dim=(23000, 23000)):
+        self.dim = dim
+        self.tile_dim = (920,920)
+        self.view = view
+        #Which level of the tile pyramid we draw from. Each level is half the size of the one before.
+        self.level = 0
+        #Decoded tiles are kept around up to the budget in bytes, so panning back and forth is cheap.
+        self.tileset = tileset(folder, budget)
+        #Tiles are decoded in the background, ahead of where the camera is heading.
+        self.prefetch = prefetcher(self.tileset, workers) if workers else None
+        #Where the camera is, so anything on the map can be brought on screen.
+        self.ij = (i, j)
+        self.memory_ij = (i, j)
+        self.velocity = (0, 0)
+        self.tiles = []
+        #The tiles under the camera are painted onto a backdrop, only when they change.
+        self.backdrop = pygame.Surface(view).convert()
+        self.painted = None
+        self.fresh = True
+
+    def update(self, i, j):
+        '''Populate self.tiles and with an ID, surface, and position IFF it is nearby to our camera.
+        Then it draws all those tiles to the screen.
+        Args: Co-oridnates of our camera.
+        Returns: a list of surfaces and their relative positions'''
+
+        self.ij = (i, j)
+        if self.prefetch:
+            heading = self.project(self.predict(i, j))
+        #Bring i,j onto the level of the pyramid we are drawing, then into absolute co-ords
+        i, j = self.project((i, j))
+        pos = tuple(map(lambda a, b: a + b, (i,j), self.dim))
+        near = [rc for rc in self.nearby(i, j)
+                if rc in self.tileset and self.lokalise((rc[2] * self.tile_dim[0], rc[1] * self.tile_dim[1]), pos)]
+
+        if self.prefetch:
+            #Take in whatever finished decoding, then ask for what we need now and where we are heading.
+            ahead = self.nearby(*heading)
+            self.prefetch.receive()
+            self.prefetch.request(near, 0)
+            self.prefetch.request(ahead, 1)
+            #Whatever we asked for that is neither here nor ahead of us any more isn't worth decoding.
+            self.prefetch.cancel(set(near) | set(ahead))
+
+        tiles = []
+        for rc in near:
+            #rc shows the level, then y then x, let's flip that to an (x,y) while we multiply by the pixel depth.
+            pic_dims_pix = (rc[2] * self.tile_dim[0], rc[1] * self.tile_dim[1])
+            #Centre the pix_cor since everything in the main loop is in reference to the camera.
+            pixdex = (pic_dims_pix[0] - self.dim[0]/2, pic_dims_pix[1] - self.dim[1]/2)
+            #Without a prefetcher the tileset decodes the tile right now if it isn't cached already.
+            surf = self.tileset.peek(rc) if self.prefetch else self.tileset.get(rc)
+            if surf:
+                tiles.append((rc, surf, pixdex))
+        self.tiles = tiles
+
+        self.fresh = self.paint(i,j)
+
+        return self.tiles
+
+    @property
+    def scale(self):
+        '''How many pixels of the map each pixel on screen covers.'''
+        return 2 ** self.level
+
+    def zoom(self, steps):
+        '''Zoom out by a number of pyramid levels, or in if steps is negative.
+        Returns: True if the level changed.'''
+        level = min(max(self.level + steps, 0), self.tileset.levels - 1)
+        changed = level != self.level
+        self.level = level
+        return changed
+
+    def project(self, pos):
+        '''Where a position relative to the camera lands at the current zoom, zooming about the centre of the view.
+        Args: pos as the co-ordinates at full size.
+        Returns: the co-ordinates at the current level of the pyramid.'''
+        return tuple(map(lambda a, v: (a - v/2) / self.scale + v/2, pos, self.view))
+
+    def unproject(self, pos):
+        '''Where a position on screen at the current zoom is relative to the camera at full size.'''
+        return tuple(map(lambda a, v: (a - v/2) * self.scale + v/2, pos, self.view))
+
+    def viewport(self, i, j, margin=0):
+        '''The rectangle of the map the camera can see at the current zoom, give or take a margin of screen pixels.
+        Args: Co-oridnates of our camera.
+        Returns: (left, top, right, bottom) co-ordinates on the map.'''
+        left, top = self.unproject((-margin, -margin))
+        right, bottom = self.unproject((self.view[0] + margin, self.view[1] + margin))
+        return (left - i, top - j, right - i, bottom - j)
+
+    def toscreen(self, pos):
+        '''Where a position on the map lands on screen, through the camera and the current zoom.'''
+        return self.project((pos[0] + self.ij[0], pos[1] + self.ij[1]))
+
+    def onscreen(self, pos, margin=0):
+        '''Is a position on the map on screen at the current zoom, give or take a margin?'''
+        x, y = self.toscreen(pos)
+        return -margin < x < self.view[0] + margin and -margin < y < self.view[1] + margin
+
+    def predict(self, i, j):
+        '''Guess where the camera will be in a little while from how it has been moving.
+        Args: Co-oridnates of our camera.
+        Returns: the predicted co-ordinates of our camera.'''
+        step = tuple(map(lambda a, b: a - b, (i, j), self.memory_ij))
+        self.velocity = tuple(map(lambda a, b: a * 0.8 + b * 0.2, self.velocity, step))
+        self.memory_ij = (i, j)
+        return tuple(map(lambda a, b: a + b * self.prefetch.lookahead, (i, j), self.velocity))
+
+    def nearby(self, i, j):
+        '''Lists the (level, row, col) of every tile that could be within an extra tile (and a bit) of our camera.
+        Args: Co-oridnates of our camera on the current level.
+        Returns: a list of (level, row, col) tuples.'''
+        tw, th = self.tile_dim
+        cols = range(math.floor((-i - tw * 2 - 100) / tw), math.ceil((-i + tw + 100) / tw) + 1)
+        rows = range(math.floor((-j - th * 2 - 100) / th), math.ceil((-j + th + 100) / th) + 1)
+        return [(self.level, r, c) for r in rows for c in cols]
+
+    def lokalise(self, k, ij):
+        '''Is the camera pos between the tile pixel index, plus or minus an extra tile (and a bit) on both axes?
+        Args: 
+            k  -> the Absolute Pixel-Co-ordinates of a tile.
+            ij -> the Inverted Absolute position of the Camera.
+        Returns: A boolean -> true if ij is in k or one of k's 8 neighbors.'''
+        a = bool(k[0] - self.tile_dim[0] - 100 < self.dim[0] - ij[0] < k[0] + self.tile_dim[0] * 2 + 100)
+        b = bool(k[1] - self.tile_dim[1] - 100 < self.dim[1] - ij[1] < k[1] + self.tile_dim[1] * 2 + 100)
+        return bool(a and b) 
+
+    def get_random_pos(self):
+        '''Generate a randomised position on the map, within range r of the centre
+        Returns : a tuple of two random ints within r of the centre'''
+        r = max(self.dim[0] // 2 - 5000, self.dim[0] // 4)
+        x = random.randint(-r, r) + self.dim[0] // 2
+        y = random.randint(-r, r) + self.dim[1] // 2
+        return (x,y)
+
+    def lock_in_bounds(self, x,y,w,v):
+        '''Checks if camera is within the borders of the map
+        Args : 
+            x and y as integers. Pixel co-ordinates to move to.
+            w and v as integers. Current pixel co-ordinates.
+        Returns :
+            new pixel co-ordinates as tuple. 
+            x&y if new pos is within the borders; w&v if not.'''
+        m = tuple(map(lambda a, b: a + b, (x,y), (self.dim[0] / 2, self.dim[1] / 2)))
+        if math.sqrt((m[0] ** 2) + (m[1] ** 2)) < ((self.dim[0] / 2)):
+            return (x, y)
+        else:
+            return (w,v)
+
+    def sort_tiles(self):
+        '''sorting the bucket of tiles just makes visualisation easy - optional'''
+        self.tiles.sort(key=lambda tup: (tup[2][0], tup[2][1]))
+
+    def paint(self, i, j):
+        '''Brings the backdrop up to date with the tiles under the camera, painting as little as it can.
+        When the camera moves the backdrop is scrolled with it and only the strips it exposes are painted,
+        and a tile that has only just been decoded is painted on its own.
+        Returns: True if the backdrop changed.'''
+        origin = (math.floor(i), math.floor(j))
+        tiles = {tile[0]: tile[1] for tile in self.tiles}
+        w, h = self.view
+        if self.painted is None or self.painted[0] != self.level:
+            self.lay(tiles, origin)
+        else:
+            level, (oi, oj), old = self.painted
+            dx, dy = origin[0] - oi, origin[1] - oj
+            arrivals = [rc for rc in tiles if rc not in old]
+            if not (dx or dy or arrivals):
+                return False
+            if abs(dx) >= w or abs(dy) >= h:
+                self.lay(tiles, origin)
+            else:
+                self.backdrop.scroll(dx, dy)
+                if dx:
+                    self.lay(tiles, origin, pygame.Rect(0 if dx > 0 else w + dx, 0, abs(dx), h))
+                if dy:
+                    self.lay(tiles, origin, pygame.Rect(0, 0 if dy > 0 else h + dy, w, abs(dy)))
+                for rc in arrivals:
+                    self.backdrop.blit(tiles[rc], (rc[2] * self.tile_dim[0] + origin[0], rc[1] * self.tile_dim[1] + origin[1]))
+        self.painted = (self.level, origin, set(tiles))
+        return True
+
+    def lay(self, tiles, origin, area=None):
+        '''Paints the tiles onto an area of the backdrop, or all of it.
+        Args:
+            tiles : a dictionary of the surface of each (level, row, col).
+            origin : where the top left corner of the map is, relative to the camera.
+            area : the rect of the backdrop to paint.'''
+        self.backdrop.set_clip(area)
+        self.backdrop.fill((0, 0, 0))
+        for rc, surf in tiles.items():
+            self.backdrop.blit(surf, (rc[2] * self.tile_dim[0] + origin[0], rc[1] * self.tile_dim[1] + origin[1]))
+        self.backdrop.set_clip(None)
+
+class ville:
+    def __init__(self, display, carte, roads, buildings, trails=True, dirty=True, seed=None,
+                 feet='assets/footprints.npz', tags='assets/nametags.npz', profile=None, shards=0, pace=None,
+                 snapshot=None):
+        '''Everyone walking around Paris and everything needed to draw them, ticked along a frame at a time.
+        Needs the display to be set up.
+        Args:
+            display : the surface to draw onto.
+            carte : the paris everyone walks around, and is drawn through.
+            roads, buildings : the heatmaps.
+            trails : True to stamp footprints into one fading layer, False for a ghost per footprint.
+            dirty : True to redraw only what has changed while the camera is still.
+            seed : seed for the swarm, so a walk can be replayed.
+            feet, tags : where to cache the pressed footprints and the rendered nametags.
+            profile : a chrono to time each phase of the frame with, or None to time nothing.
+            shards : how many worker processes to path-find in, or 0 to path-find in this one.
+            pace : a horloge deciding how many ticks of simulation to run each frame, or None for one a frame.
+            snapshot : a snapshot from cliche.develop, to take the pressed feet and nametags from. See restore.'''
+        #Every sprite is drawn through the same map onto the same display.
+        global Map, gameDisplay
+        Map, gameDisplay = carte, display
+        self.display = display
+        self.Map = carte
+
+        #Feet: every footprint at every angle, pressed once for all the citizens.
+        print(" -> Feet")
+        parisian.feet = footprints(cache=feet, cells=snapshot['feet'] if snapshot else None,
+                                   recipe=str(snapshot['feet_recipe']) if snapshot else None)
+
+        print(" -> Citizens")
+        self.citizens = pygame.sprite.OrderedUpdates()
+        parisian.grid = quartier()
+
+        #Flock: the walking state of every citizen, so they can all path-find in one go.
+        #With shards, the citizens are split between worker processes, and walk exactly as they would here.
+        print(" -> Flock")
+        if shards:
+            self.flock = arrondissements(roads, buildings, seed=seed, shards=shards)
+        else:
+            self.flock = swarm(roads, buildings, seed=seed)
+
+        #Gallery: one name tag for each parisian which follows the parisian around.
+        print(" -> Gallery")
+        self.gallery = pygame.sprite.OrderedUpdates()
+        portrait.tags = nametags(cache=tags, pixels=snapshot['tags'] if snapshot else None)
+        portrait.grid = quartier()
+        portrait.cortege = cortege()
+
+        #Graveyard: Copies of the parisians at a past position and orientation.
+        print(" -> Graveyard")
+        self.graveyard = pygame.sprite.Group()
+        ghost.grid = quartier()
+
+        #Footpath: rather than a ghost for each step, stamp them all into one layer that fades as a whole.
+        #Only one in every footprints parisians leaves a trace, in either.
+        print(" -> Footpath")
+        self.trails = trails
+        self.footprints = 1
+        self.footpath = trail(carte.view)
+
+        #Stage: rather than repaint the whole screen every frame, redraw only what changed while the camera is still.
+        print(" -> Stage")
+        self.dirty = dirty
+        self.scene = stage(carte.backdrop)
+
+        #Profile: how long each phase of the frame takes. Switched off it costs next to nothing.
+        self.profile = profile if profile is not None else chrono(on=False)
+
+        #Pace: how many ticks of simulation to run each frame, so walking speed doesn't follow the frame rate.
+        self.pace = pace if pace is not None else horloge()
+
+        #Where the camera was last frame, and who was near it, so we can freshen up anyone who has just come into view.
+        self.ij = carte.ij
+        self.view = carte.viewport(*carte.ij, 200)
+        self.seen = set()
+
+    def enlist(self, name, pos, time):
+        '''Create a parisian and a nametag for them.
+        Args:
+            name : their name.
+            pos : where they start on the map.
+            time : a seed for their internal clock.
+        Returns: the new parisian.'''
+        new_crt = parisian(name, pos, time, self.flock)
+        new_pnt = portrait(new_crt)
+        portrait.grid.place(new_pnt, new_pnt.position)
+        #Stick them in the lists.
+        self.citizens.add(new_crt)
+        self.gallery.add(new_pnt)
+        return new_crt
+
+    def restore(self, snapshot):
+        '''Enlist everyone in a snapshot from cliche.develop, and put them back just as they were.
+        Args: snapshot as a dictionary of the snapshot.
+        Returns: how many citizens were restored.'''
+        flock = self.flock
+        cortege = portrait.cortege
+        for name, pos in zip(snapshot['names'], snapshot['position']):
+            self.enlist(str(name), pos, 0)
+        n = len(snapshot['names'])
+        #Enlisting rolled a few dice of its own, so overwrite everyone's state with the snapshot's.
+        for key in ('position', 'theta', 'laptime', 'transitioning', 'inside', 'dextra'):
+            getattr(flock, key)[:n] = snapshot[key]
+        flock.radius = int(snapshot['radius'])
+        flock.clock = int(snapshot['clock'])
+        flock.key = snapshot['key']
+        flock.slots[:] = snapshot['slots']
+        flock.rng.bit_generator.state = json.loads(str(snapshot['rng']))
+        cortege.position[:n] = snapshot['tag_position']
+        cortege.laptime[:n] = snapshot['tag_laptime']
+        cortege.target[:n] = snapshot['tag_target']
+        cortege.watch = int(snapshot['tag_watch'])
+        for painting in self.gallery:
+            painting.grid.place(painting, painting.position)
+            painting.agent.dancing_feet()
+
+        #The camera, and the footprints it could see.
+        self.ij = tuple(float(c) for c in snapshot['camera'])
+        self.zoom(int(snapshot['level']) - self.Map.level)
+        if self.trails and snapshot['footpath'].shape[:2] == self.footpath.image.get_size()[::-1]:
+            self.footpath.adopt(snapshot['footpath'])
+        return n
+
+    def populate(self, n):
+        '''Keep the first n citizens walking, and the rest resting where they are, neither moved nor drawn.'''
+        n = min(n, len(self.flock))
+        for painting in self.gallery:
+            agent = painting.agent
+            if agent.idx < n:
+                parisian.grid.place(agent, agent.position)
+                portrait.grid.place(painting, painting.position)
+            else:
+                parisian.grid.remove(agent)
+                portrait.grid.remove(painting)
+        self.flock.active = n
+
+    def zoom(self, steps):
+        '''Zoom through the levels of the tile pyramid. The old footpath no longer lines up, so sweep it.'''
+        if self.Map.zoom(steps):
+            self.footpath.clear()
+
+    def step(self):
+        '''Move everyone along one tick of simulation time, leaving the drawing to the frame.'''
+        flock = self.flock
+        footpath = self.footpath
+        watch = self.profile
+
+        #Who is due to move, and who of those needs to stand still?
+        with watch.scope('footsteps'):
+            due, walkers = flock.petrify()
+            for idx in walkers:
+                agent = flock.agents[idx]
+                #It's expensive to render gosts, so let's only make them if our parisian is on screen.
+                if idx % self.footprints == 0 and Map.onscreen(agent.position, 200):
+                    if self.trails:
+                        footpath.stamp(parisian.feet.pick(agent.theta, agent.dextra), Map.toscreen(agent.position))
+                    else:
+                        nicholas = ghost(*agent.geminio())
+                        self.graveyard.add(nicholas)
+                        ghost.grid.place(nicholas, nicholas.position)
+        #Where do we want to go? Everyone decides at once.
+        with watch.scope('path_find'):
+            flock.path_find(walkers)
+            for idx in walkers:
+                #Go there!
+                with watch.sample('locomotor', idx):
+                    flock.agents[idx].locomotor()
+        with watch.scope('dancing_feet'):
+            for idx in due:
+                #Swap feet and orientate ourselves in the direction of our velocity, if anyone can see us.
+                agent = flock.agents[idx]
+                if agent in self.seen:
+                    with watch.sample('dancing_feet', idx):
+                        agent.dancing_feet()
+
+        with watch.scope('ghost.sedate'):
+            shown = set(ghost.grid.query(self.view))
+            for nick in self.graveyard:
+                #Reduce alpha channel and align with past orientation, or just fade if nobody can see us.
+                if nick in shown:
+                    nick.sedate()
+                else:
+                    nick.linger()
+
+        #Every nametag due to seek their parisian does so at once, then the ones that moved change cell if they must.
+        with watch.scope('gallery.seek'):
+            for idx in portrait.cortege.seek(flock.position):
+                painting = portrait.cortege.members[idx]
+                #The nametags of resting parisians keep off the grid until they walk again.
+                if painting in painting.grid:
+                    painting.grid.place(painting, painting.position)
+            portrait.cortege.update()
+
+        #Spin everyone's clocks, and fade the footpath a little.
+        flock.update()
+        if self.trails:
+            footpath.update()
+
+    def tick(self, i, j):
+        '''Run as many ticks of simulation as are owed, and draw everyone.
+        Args: Co-oridnates of our camera.
+        Returns: the rects of the display that have changed.'''
+        footpath = self.footpath
+        watch = self.profile
+        #We want a copy of where we were before the camera moved.
+        memory_ij, self.ij = self.ij, (i, j)
+
+        #Draw Map to background
+        with watch.scope('Map.update'):
+            Map.update(i, j)
+
+        #Only the sprites within a margin of the camera are worth updating and drawing.
+        self.view = view = Map.viewport(i, j, 200)
+
+        #Scroll the footpath with the map first, as footprints are stamped where the camera is now.
+        footpath.scroll((i - memory_ij[0]) / Map.scale, (j - memory_ij[1]) / Map.scale)
+
+        #Walk everyone along for however long it has been since the last frame, within budget.
+        for _ in self.pace.steps():
+            self.step()
+
+        near = parisian.grid.query(view)
+        with watch.scope('dancing_feet'):
+            for agent in near:
+                #Anyone just come into view may have been facing the wrong way for a while.
+                if agent not in self.seen:
+                    agent.dancing_feet()
+            self.seen = set(near)
+
+        #Update, only what is near the camera.
+        with watch.scope('update'):
+            for agent in near:
+                agent.update()
+            nicks = ghost.grid.query(view)
+            for nick in nicks:
+                nick.update()
+            nicks = [nick for nick in nicks if nick.alive()]
+            paintings = portrait.grid.query(view)
+            for painting in paintings:
+                painting.update()
+
+        #Render
+        if self.dirty:
+            with watch.scope('draw.stage'):
+                self.scene.cast(near, nicks, [footpath] if self.trails else [], paintings)
+                if Map.fresh:
+                    #The camera moved, so everything on screen moved with it.
+                    self.scene.repaint_rect(self.display.get_rect())
+                else:
+                    if self.trails:
+                        for rect in footpath.changes():
+                            self.scene.repaint_rect(rect)
+                    #Paint over wherever the overlay was last frame.
+                    if watch.shown:
+                        self.scene.repaint_rect(watch.shown)
+                rects = self.scene.draw(self.display)
+        else:
+            with watch.scope('draw.backdrop'):
+                self.display.blit(Map.backdrop, (0, 0))
+            with watch.scope('draw.citizens'):
+                self.display.blits([(agent.image, agent.rect) for agent in near], False)
+            with watch.scope('draw.graveyard'):
+                self.display.blits([(nick.image, nick.rect) for nick in nicks], False)
+            if self.trails:
+                with watch.scope('draw.footpath'):
+                    footpath.draw(self.display)
+            with watch.scope('draw.gallery'):
+                self.display.blits([(painting.image, painting.rect) for painting in paintings], False)
+            rects = [self.display.get_rect()]
+        watch.shown = None
+        hud = watch.draw(self.display)
+        if hud:
+            rects.append(hud)
+        return rects
+
+    def close(self):
+        '''Keep the nametags for next time, and let the tile decoding threads and any workers finish.'''
+        portrait.tags.save()
+        self.flock.close()
+        if Map.prefetch:
+            Map.prefetch.stop()
@@ -0,0 +1,74 @@
+#--------------------- IMPORTS ---------------------
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from atlas import nametags
+from city import parisian, portrait
+
+#--------------------- GLOBALS ---------------------
+#Bump this whenever what goes into a snapshot changes, so an old one is ignored rather than misread.
+VERSION = 2
+
+#--------------------- FUNCTIONS ---------------------
+def snap(town, path):
+    '''Writes everything needed to pick up where a town left off into one binary file: the camera,
+    every citizen's walking state and name, their nametags, and the pressed feet, nametags and footpath
+    so nothing has to be drawn again.
+    Args:
+        town : the ville to snapshot.
+        path : where to write the snapshot.'''
+    flock = town.flock
+    cortege = portrait.cortege
+    n = len(flock)
+    tags = portrait.tags
+    state = {
+        'version': np.array(VERSION),
+        'camera': np.array(town.ij, np.float64),
+        'level': np.array(town.Map.level),
+        'names': np.array([agent.name for agent in flock.agents], dtype=str),
+        'position': flock.position[:n],
+        'theta': flock.theta[:n],
+        'laptime': flock.laptime[:n],
+        'transitioning': flock.transitioning[:n],
+        'inside': flock.inside[:n],
+        'dextra': flock.dextra[:n],
+        'radius': np.array(flock.radius),
+        'clock': np.array(flock.clock),
+        'key': flock.key,
+        'slots': flock.slots,
+        'rng': np.array(json.dumps(flock.rng.bit_generator.state)),
+        'tag_position': cortege.position[:len(cortege)],
+        'tag_laptime': cortege.laptime[:len(cortege)],
+        'tag_target': cortege.target[:len(cortege)],
+        'tag_watch': np.array(cortege.watch),
+        'feet': parisian.feet.cells,
+        'feet_recipe': np.array(parisian.feet.recipe),
+        'footpath': town.footpath.pixels() if town.trails else np.zeros((0, 0, 4), np.uint8),
+    }
+    #The nametag of everyone in town.
+    for key, value in tags.pack({agent.name for agent in flock.agents}).items():
+        state[f'tag_{key}'] = value
+    #Write to the side and swap it in, so quitting halfway never leaves a broken snapshot.
+    with open(f"{path}.part", "wb") as f:
+        np.savez_compressed(f, **state)
+    os.replace(f"{path}.part", path)
+
+def develop(path):
+    '''Reads a snapshot back.
+    Returns: a dictionary of the snapshot, with the nametags unpacked, or None if there isn't a usable one.'''
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as f:
+            state = {key: f[key] for key in f.files}
+        if int(state['version']) != VERSION:
+            print(f"Ignoring {path}, it is from another version.")
+            return None
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        print(f"Ignoring {path}, it can't be read: {e}")
+        return None
+    state['tags'] = nametags.unpack({key: state[f'tag_{key}'] for key in ('style', 'names', 'sizes', 'pixels')})
+    return state
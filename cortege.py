@@ -0,0 +1,73 @@
+#--------------------- IMPORTS ---------------------
+import math
+
+import numpy as np
+
+#--------------------- OBJECTS ---------------------
+class cortege:
+    def __init__(self, watch=50, throttle=45):
+        '''Holds where every nametag is and which parisian it follows in numpy arrays, so they can all seek at once.
+        Args:
+            watch : how many frames between each movement, spread over a few seeks.
+            throttle : how close a nametag is happy to be to its parisian, and how slowly it closes the gap.'''
+        self.watch = watch
+        self.throttle = throttle
+        self.members = []
+        self.position = np.zeros((0, 2), np.int64)
+        self.laptime = np.zeros(0, np.int64)
+        self.target = np.zeros(0, np.intp)
+
+    def __len__(self):
+        return len(self.members)
+
+    def enlist(self, painting, agent):
+        '''Give a nametag a row in the cortege, bound to the parisian it follows.
+        Args:
+            painting : the portrait sprite that will read back its position.
+            agent : the parisian to follow, starting on top of them and in step with their clock.
+        Returns: the index of the nametag in the cortege.'''
+        idx = len(self.members)
+        #Double the arrays when we run out of room so enlisting stays cheap.
+        if idx == len(self.laptime):
+            self.grow(max(64, idx * 2))
+        self.position[idx] = agent.position
+        self.laptime[idx] = agent.laptime % self.watch
+        self.target[idx] = agent.idx
+        self.members.append(painting)
+        return idx
+
+    def dismiss(self, painting):
+        '''Take a nametag out of the cortege, moving the last one into its row so the arrays stay packed.'''
+        idx = painting.idx
+        last = len(self.members) - 1
+        for key in ('position', 'laptime', 'target'):
+            arr = getattr(self, key)
+            arr[idx] = arr[last]
+        self.members[idx] = self.members[last]
+        self.members[idx].idx = idx
+        self.members.pop()
+        painting.idx = None
+
+    def grow(self, size):
+        '''Resize every array to hold size nametags, keeping the ones we have.'''
+        for key in ('position', 'laptime', 'target'):
+            old = getattr(self, key)
+            new = np.zeros((size,) + old.shape[1:], old.dtype)
+            new[:len(old)] = old
+            setattr(self, key, new)
+
+    def seek(self, positions):
+        '''Every nametag due to move takes a step towards its parisian, unless it is already close enough.
+        Args: positions as the swarm's array of parisian positions on the map.
+        Returns: an index array of the nametags that moved.'''
+        n = len(self.members)
+        due = np.flatnonzero(self.laptime[:n] % math.ceil(self.watch / 8) == 0)
+        vector = positions[self.target[due]] - self.position[due]
+        far = np.hypot(vector[:, 0], vector[:, 1]) >= self.throttle
+        self.position[due[far]] += np.floor_divide(vector[far], self.throttle)
+        return due[far]
+
+    def update(self):
+        '''Spin everyone's internal clock.'''
+        n = len(self.members)
+        self.laptime[:n] = (self.laptime[:n] + 1) % self.watch
@@ -0,0 +1,106 @@
+#--------------------- IMPORTS ---------------------
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from city import portrait
+
+#--------------------- GLOBALS ---------------------
+#Each level of quality, from the cheapest to the best.
+#population : the share of every citizen enlisted who walks.
+#radius : how far each parisian can see and move each calculation, swarm.radius.
+#footprints : one in every this many parisians leaves footprints or ghosts.
+#nametags : how many frames between each movement of a nametag, cortege.watch.
+LEVELS = [
+    {'population': 0.2, 'radius': 8, 'footprints': 4, 'nametags': 200},
+    {'population': 0.35, 'radius': 10, 'footprints': 3, 'nametags': 150},
+    {'population': 0.5, 'radius': 12, 'footprints': 2, 'nametags': 100},
+    {'population': 0.75, 'radius': 15, 'footprints': 1, 'nametags': 75},
+    {'population': 1., 'radius': 15, 'footprints': 1, 'nametags': 50},
+]
+
+#--------------------- OBJECTS ---------------------
+class gouverneur:
+    def __init__(self, town, target=60, path='assets/quality.json', window=120, low=0.6, high=0.9, settle=3.,
+                 patience=10., levels=LEVELS):
+        '''Watches how long each frame takes and turns the quality of a town up or down to hold a frame rate.
+        It only turns quality down when frames are close to overrunning, and only back up when they are well clear,
+        and every time turning up has to be undone it waits twice as long before trying again.
+        Args:
+            town : the ville to govern, with everyone already enlisted.
+            target : the frame rate to hold.
+            path : where to keep the level we settled on, so the next boot starts there. None to keep nothing.
+            window : how many frames to judge by.
+            low, high : the share of a frame's time the 90th percentile frame may take before turning up or down.
+            settle : how many seconds to wait after a change before turning down again.
+            patience : how many seconds to wait after a change before turning up again.
+            levels : the settings at each level of quality, cheapest first.'''
+        self.town = town
+        self.target = target
+        self.path = path
+        self.low = low
+        self.high = high
+        self.settle = settle
+        self.patience = patience
+        self.levels = levels
+        self.times = deque(maxlen=window)
+        self.load = None
+        self.climbed = False
+        self.level = len(levels) - 1
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.level = min(max(int(json.load(f)['level']), 0), len(levels) - 1)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                #A file we can't make sense of is no worse than none, start from the top.
+                print(f"Ignoring {path}, it can't be read: {e}")
+        self.apply(self.level)
+
+    def apply(self, level):
+        '''Set the town to a level of quality.'''
+        self.level = level
+        settings = self.levels[level]
+        self.town.populate(round(settings['population'] * len(self.town.flock)))
+        self.town.flock.radius = settings['radius']
+        self.town.footprints = settings['footprints']
+        portrait.cortege.watch = settings['nametags']
+        self.changed = time.perf_counter()
+        self.times.clear()
+        print(f"-> Quality {level} :: {settings}")
+
+    def watch(self, ms):
+        '''Judge the frame that just ran, and turn quality up or down if we must.
+        Args: ms as how long the frame took to run, not counting any time spent waiting for the frame rate.'''
+        self.times.append(ms)
+        if len(self.times) < self.times.maxlen:
+            return
+        self.load = float(np.percentile(self.times, 90)) * self.target / 1000
+        waited = time.perf_counter() - self.changed
+        if self.load > self.high and self.level > 0 and waited >= self.settle:
+            #Climbing only to fall straight back is flapping, so be slower to climb next time.
+            if self.climbed and waited < self.patience * 2:
+                self.patience = min(self.patience * 2, 300)
+            self.climbed = False
+            self.shift(-1)
+        elif self.load < self.low and self.level < len(self.levels) - 1 and waited >= self.patience:
+            self.climbed = True
+            self.shift(1)
+
+    def shift(self, step):
+        self.apply(self.level + step)
+        self.save()
+
+    def report(self):
+        return {'target': self.target, 'level': self.level, 'load': self.load and round(self.load, 3),
+                'patience': self.patience, 'settings': self.levels[self.level]}
+
+    def save(self):
+        '''Keep the level we are on for the next boot.'''
+        if not self.path:
+            return
+        with open(f"{self.path}.part", "w") as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(f"{self.path}.part", self.path)
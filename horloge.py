@@ -0,0 +1,50 @@
+#--------------------- IMPORTS ---------------------
+import time
+
+#--------------------- OBJECTS ---------------------
+class horloge:
+    def __init__(self, rate=None, budget=10, backlog=None):
+        '''Decides how many ticks of simulation to run each frame, so everyone walks at the same speed
+        whatever the frame rate, and a slow tick is carried over to the next frame rather than stalling this one.
+        Args:
+            rate : ticks of simulation a second, or None to run exactly one tick every frame.
+            budget : how many ms a frame may spend on ticks. The first tick owed always runs.
+            backlog : the most ticks that can be owed, half a second's worth by default.
+                Beyond that the simulation slows down rather than trying to catch up.'''
+        self.rate = rate
+        self.budget = budget
+        self.backlog = backlog if backlog is not None else max(1, (rate or 0) // 2)
+        self.owed = 0.
+        self.last = None
+        #How many ticks ran last frame and altogether, and how many have been given up on.
+        self.ran = 0
+        self.ticks = 0
+        self.dropped = 0
+
+    def steps(self):
+        '''Yields once for every tick to run this frame.'''
+        now = time.perf_counter()
+        if self.rate is None:
+            self.ran = 1
+            self.ticks += 1
+            yield
+            return
+        #The first frame runs a tick, after that we owe one for every 1/rate seconds that have gone by.
+        self.owed += 1. if self.last is None else (now - self.last) * self.rate
+        self.last = now
+        if self.owed > self.backlog:
+            self.dropped += int(self.owed - self.backlog)
+            self.owed = float(self.backlog)
+        self.ran = 0
+        while self.owed >= 1:
+            #Whatever is left over when the budget runs out is still owed next frame.
+            if self.ran and (time.perf_counter() - now) * 1e3 >= self.budget:
+                break
+            yield
+            self.owed -= 1
+            self.ran += 1
+            self.ticks += 1
+
+    def report(self):
+        return {'rate': self.rate, 'budget': self.budget, 'ran': self.ran, 'ticks': self.ticks,
+                'owed': round(self.owed, 2), 'dropped': self.dropped}
@@ -1,10 +1,20 @@
+import hashlib
 import io
-from prettymaps import *
+import json
+import os
 import pickle
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from prettymaps import *
 import matplotlib.font_manager as fm
 from matplotlib import pyplot as plt
-from PIL import Image, ImageFilter, ImageOps, PngImagePlugin
+from PIL import Image, PngImagePlugin
+import numpy as np
 from numpy import asarray
+from vinegar import brine
+import darkroom
+import sizzors
 
 #----------- GLOBALS ------------------
 Image.MAX_IMAGE_PIXELS = 529000000 + 1
@@ -14,11 +24,18 @@ map_location = (48.86554, 2.32115)
 class map_out:
 
     def __init__(self, x):
-        if not isinstance(x, PngImagePlugin.PngImageFile):
-            raise ValueError("A map_out only accepts objects of type PIL.PngImagePulgin.PngImageFile")
+        #A map_out is either an image in memory, or a .npy on disk that is streamed a strip at a time.
+        if isinstance(x, str) and x.endswith('.npy'):
+            self.img = None
+            self.npy = x
+        elif not isinstance(x, PngImagePlugin.PngImageFile):
+            raise ValueError("A map_out only accepts objects of type PIL.PngImagePulgin.PngImageFile or a path to a .npy")
             exit()
-        self.img = x
+        else:
+            self.img = x
+            self.npy = None
         self.name = ''
+        self.steps = []
 
     def append_mark(self, mark):
         if not self.name == '':
@@ -27,13 +44,38 @@ class map_out:
             self.name = mark
         return self
 
+    def dip(self, *step):
+        '''Queues a filter from darkroom.KERNELS. Queued filters run together, a strip at a time, when the map is developed.'''
+        self.steps.append(step)
+        return self
+
+    def develop(self):
+        '''Runs the queued filters over the map.'''
+        if not self.steps:
+            return self
+        if self.img is not None:
+            self.img = Image.fromarray(darkroom.develop_array(asarray(self.img), self.steps))
+        else:
+            darkroom.develop(self.npy, f"{self.name}.npy", self.steps)
+            self.npy = f"{self.name}.npy"
+        self.steps = []
+        return self
+
     def vinegar(self):
-        '''Pickles a map_out'''
-        pickle.dump(asarray(self.img), open(f"{self.name}.b", "wb"))
+        '''Brines a map_out as a memory mappable .npy'''
+        self.develop()
+        if self.img is not None:
+            brine(asarray(self.img), self.name)
+        elif self.npy != f"{self.name}.npy":
+            shutil.copyfile(self.npy, f"{self.name}.npy")
         return self
 
     def todisk(self):
-        self.img.save(f"{self.name}.png")
+        self.develop()
+        if self.img is not None:
+            self.img.save(f"{self.name}.png")
+        else:
+            darkroom.topng(self.npy, f"{self.name}.png")
         return self
 
 def fig_to_img(fig):
@@ -45,292 +87,341 @@ def fig_to_img(fig):
     buf.seek(0)
     return Image.open(buf)
 
-def createMara(dimy):
-    ''' Create a map of Paris.
+#------------- STYLES ----------------
+#Streets and their widths
+street_widths = {
+    'motorway': 5,
+    'trunk': 5,
+    'primary': 4.5,
+    'secondary': 4,
+    'tertiary': 3.5,
+    'residential': 3,
+    'service': 2,
+    'unclassified': 2,
+    'pedestrian': 2,
+    'footway': 1,
+}
+
+#name : (which OpenStreetMap layers to plot and their parameters, drawing_kwargs)
+#   Specify a layer name (for example, 'building') and which OpenStreetMap tags to fetch,
+#   then reference it in drawing_kwargs and specify matplotlib parameters to draw it.
+#   The perimeter is the circle of map_radius around map_location.
+styles = {
+    'Mara': (
+        {
+            'perimeter': {},
+            'streets': {'width': street_widths},
+            'building': {'tags': {'building': True, 'landuse': 'construction'}, 'union': False},
+            'water': {'tags': {'natural': ['water', 'bay']}},
+            'green': {'tags': {'landuse': 'grass', 'natural': ['island', 'wood'], 'leisure': 'park'}},
+            'forest': {'tags': {'landuse': 'forest'}},
+            'parking': {'tags': {'amenity': 'parking', 'highway': 'pedestrian', 'man_made': 'pier'}}
+        },
+        {
+            'background': {'fc': '#010101', 'ec': '#010101', 'hatch': 'ooo...', 'zorder': -1},
+            'perimeter': {'fc': '#B59C7D', 'ec': '#B59C7D', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
+            'green': {'fc': '#0C330A', 'ec': '#003D31', 'lw': 1, 'zorder': 1},
+            'forest': {'fc': '#154012', 'ec': '#112e18', 'lw': 1, 'zorder': 1},
+            'water': {'fc': '#000520', 'ec': '#001929', 'hatch': 'ooo...', 'hatch_c': '#005082', 'lw': 1, 'zorder': 2},
+            'parking': {'fc': '#A99580', 'ec': '#A99580', 'lw': 1, 'zorder': 3},
+            'streets': {'fc': '#2F3737', 'ec': '#475657', 'alpha': 1, 'lw': 0, 'zorder': 3},
+            'building': {'palette': ['#956B4B', '#7A583E', '#443122'], 'ec': '#2F3737', 'lw': .5, 'zorder': 4},
+        }
+    ),
+    'Amen': (
+        {
+            'perimeter': {},
+            'pubscafes': {'tags': {'amenity': 'bars', 'amenity': 'cafe', 'amenity': 'pub'}, 'union': False},
+            'eaters': {'tags': {'amenity': 'biergarten', 'amenity': 'restaurant'}, 'union': False},
+            'life': {'tags': {'amenity': 'theatre', 'amenity': 'nightclub', 'amenity': 'library'}, 'union': False},
+            'buyandstay': {'tags': {'building': 'supermarket', 'building': 'hotel'}, 'union': False}
+        },
+        {
+            'perimeter': {'fc': '#EEEEEE', 'ec': '#EEEEEE', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
+            'pubscafes': {'fc': '#AA3333', 'ec': '#BBBBBB', 'lw': 0, 'hatch': 'xxx...',  'zorder': 0},
+            'eaters': {'fc': '#33AA33', 'ec': '#BBBBBB', 'lw': 0, 'hatch': 'zzz...',  'zorder': 0},
+            'life': {'fc': '#3333AA', 'ec': '#BBBBBB', 'lw': 0, 'hatch': 'yyy...',  'zorder': 0},
+            'buyandstay': {'fc': '#AA7777', 'ec': '#BBBBBB', 'lw': 0, 'hatch': '###...',  'zorder': 0}
+        }
+    ),
+    'Ngtv_streets': (
+        {
+            'perimeter': {},
+            'streets': {'width': street_widths},
+            'building': {'tags': {'building': True, 'landuse': 'construction'}, 'union': False},
+        },
+        {
+            'background': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'hatch': 'ooo...', 'zorder': -1},
+            'perimeter': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
+            'streets': {'fc': '#000000', 'ec': '#000000', 'alpha': 1, 'lw': 0, 'zorder': 3},
+            'building': {'palette': ['#AAAAAA', '#AAAAAA', '#AAAAAA'], 'ec': '#AAAAAA', 'lw': .5, 'zorder': 4},
+        }
+    ),
+    'Ngtv_buildings': (
+        {
+            'perimeter': {},
+            'streets': {'width': street_widths},
+            'building': {'tags': {'building': True, 'landuse': 'construction'}, 'union': False},
+        },
+        {
+            'background': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'hatch': 'ooo...', 'zorder': -1},
+            'perimeter': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
+            'streets': {'fc': '#AAAAAA', 'ec': '#AAAAAA', 'alpha': 1, 'lw': 0, 'zorder': 3},
+            'building': {'palette': ['#000000', '#000000', '#000000'], 'ec': '#000000', 'lw': .5, 'zorder': 4},
+        }
+    ),
+}
+
+#------------- GEOMETRY ----------------
+#Geometries already loaded in this process, by the path they came from.
+surveyed = {}
+
+def survey(fixture=None, folder='geometry'):
+    '''Fetches every layer any style needs from OpenStreetMap, once, into an on-disk cache.
+    The cache is keyed on map_location, map_radius and the layers' tags, so changing any of them fetches afresh.
     Args:
-        dimy (int) : the width and height of the map
-    Returns: The name of the file created as string'''
-
+        fixture : the path to a cache file to use instead, to render offline.
+        folder : where to keep the cache.
+    Returns: the path to the pickled geometries, by layer name.'''
+    if fixture:
+        return fixture
+    layers = {}
+    for style in styles.values():
+        for name, spec in style[0].items():
+            if layers.setdefault(name, spec) != spec:
+                raise ValueError(f"Two styles ask for a layer called {name} with different tags")
+    key = hashlib.blake2b(repr((map_location, map_radius, sorted(layers.items()))).encode(), digest_size=8).hexdigest()
+    path = f"{folder}/{key}.b"
+    if not os.path.exists(path):
+        print(f"Fetching {', '.join(layers)} from OpenStreetMap. This only happens once.")
+        os.makedirs(folder, exist_ok=True)
+        #prettymaps fetches while it plots, so plot nothing onto a throwaway figure.
+        fig, ax = plt.subplots(figsize = (1, 1))
+        geometries = plot(map_location, radius = map_radius, ax = ax, layers = layers, drawing_kwargs = {})
+        plt.close(fig)
+        with open(f"{path}.part", "wb") as f:
+            pickle.dump(dict(geometries), f)
+        os.replace(f"{path}.part", path)
+    return path
+
+def geometry(source):
+    '''Loads the geometries from a survey, once per process.
+    Returns: the geometries by layer name.'''
+    if source not in surveyed:
+        with open(source, "rb") as f:
+            surveyed[source] = pickle.load(f)
+    return surveyed[source]
+
+def draw(style, ax, source=None):
+    '''Plots a style from styles onto a matplotlib axis, from the geometries of a survey.
+    Returns: the geometries prettymaps drew, by layer name.'''
+    layers, drawing_kwargs = styles[style]
+    geometries = geometry(source or survey())
+    return plot(map_location, radius = map_radius, ax = ax, layers = layers, drawing_kwargs = drawing_kwargs,
+                backup = {name: geometries[name] for name in layers})
+
+def sketch(style, dimy, source=None):
+    '''Draws a whole style into one figure of dimy by dimy inches.
+    Returns: a map_out marked with the name of the style.'''
     # Init matplotlib figure
     fig, ax = plt.subplots(figsize = (dimy, dimy), constrained_layout = True)
+    draw(style, ax, source)
+    return map_out(fig_to_img(plt)).append_mark(style)
 
-    layers = plot(
-        # Address:
-        map_location,
-        # Plot geometries in a circle of radius:
-        radius = map_radius,
-        # Matplotlib axis
-        ax = ax,
-        # Which OpenStreetMap layers to plot and their parameters:
-        layers = {
-                # Perimeter (in this case, a circle)
-                'perimeter': {},
-                # Streets and their widths
-                'streets': {
-                    'width': {
-                        'motorway': 5,
-                        'trunk': 5,
-                        'primary': 4.5,
-                        'secondary': 4,
-                        'tertiary': 3.5,
-                        'residential': 3,
-                        'service': 2,
-                        'unclassified': 2,
-                        'pedestrian': 2,
-                        'footway': 1,
-                    }
-                },
-                # Other layers:
-                #   Specify a name (for example, 'building') and which OpenStreetMap tags to fetch
-                'building': {'tags': {'building': True, 'landuse': 'construction'}, 'union': False},
-                'water': {'tags': {'natural': ['water', 'bay']}},
-                'green': {'tags': {'landuse': 'grass', 'natural': ['island', 'wood'], 'leisure': 'park'}},
-                'forest': {'tags': {'landuse': 'forest'}},
-                'parking': {'tags': {'amenity': 'parking', 'highway': 'pedestrian', 'man_made': 'pier'}}
-            },
-            # drawing_kwargs:
-            #   Reference a name previously defined in the 'layers' argument and specify matplotlib parameters to draw it
-            drawing_kwargs = {
-                'background': {'fc': '#010101', 'ec': '#010101', 'hatch': 'ooo...', 'zorder': -1},
-                'perimeter': {'fc': '#B59C7D', 'ec': '#B59C7D', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
-                'green': {'fc': '#0C330A', 'ec': '#003D31', 'lw': 1, 'zorder': 1},
-                'forest': {'fc': '#154012', 'ec': '#112e18', 'lw': 1, 'zorder': 1},
-                'water': {'fc': '#000520', 'ec': '#001929', 'hatch': 'ooo...', 'hatch_c': '#005082', 'lw': 1, 'zorder': 2},
-                'parking': {'fc': '#A99580', 'ec': '#A99580', 'lw': 1, 'zorder': 3},
-                'streets': {'fc': '#2F3737', 'ec': '#475657', 'alpha': 1, 'lw': 0, 'zorder': 3},
-                'building': {'palette': ['#956B4B', '#7A583E', '#443122'], 'ec': '#2F3737', 'lw': .5, 'zorder': 4},
-            }
-    )
-    mara = map_out(fig_to_img(plt))
-    mara.append_mark("Mara")
-    return mara
-
-def getAmenity(dimy):
-    ''' Create a map of Paris with just amenity.
+#------------- MAPS ----------------
+def createMara(dimy, source=None):
+    ''' Create a map of Paris.
     Args:
         dimy (int) : the width and height of the map
-    Returns: The name of the file created as string'''
+        source : the path to the geometries to draw from, surveyed if not given
+    Returns: The map as a map_out'''
+    return sketch('Mara', dimy, source)
 
-    # Init matplotlib figure
-    fig, ax = plt.subplots(figsize = (dimy, dimy), constrained_layout = True)
+def getAmenity(dimy, source=None):
+    ''' Create a map of Paris with just amenity.
+    Args:
+        dimy (int) : the width and height of the map
+        source : the path to the geometries to draw from, surveyed if not given
+    Returns: The map as a map_out'''
+    return sketch('Amen', dimy, source)
 
-    layers = plot(
-        # Address:
-        map_location,
-        # Plot geometries in a circle of radius:
-        radius = map_radius,
-        # Matplotlib axis
-        ax = ax,
-        # Which OpenStreetMap layers to plot and their parameters:
-        layers = {
-                # Perimeter (in this case, a circle)
-                'perimeter': {},
-                'pubscafes': {'tags': {'amenity': 'bars', 'amenity': 'cafe', 'amenity': 'pub'}, 'union': False},
-                'eaters': {'tags': {'amenity': 'biergarten', 'amenity': 'restaurant'}, 'union': False},
-                'life': {'tags': {'amenity': 'theatre', 'amenity': 'nightclub', 'amenity': 'library'}, 'union': False},
-                'buyandstay': {'tags': {'building': 'supermarket', 'building': 'hotel'}, 'union': False}
-            },
-            # drawing_kwargs:
-            #   Reference a name previously defined in the 'layers' argument and specify matplotlib parameters to draw it
-            drawing_kwargs = {
-                # Perimeter (in this case, a circle)
-                'perimeter': {'fc': '#EEEEEE', 'ec': '#EEEEEE', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
-                'pubscafes': {'fc': '#AA3333', 'ec': '#BBBBBB', 'lw': 0, 'hatch': 'xxx...',  'zorder': 0},
-                'eaters': {'fc': '#33AA33', 'ec': '#BBBBBB', 'lw': 0, 'hatch': 'zzz...',  'zorder': 0},
-                'life': {'fc': '#3333AA', 'ec': '#BBBBBB', 'lw': 0, 'hatch': 'yyy...',  'zorder': 0},
-                'buyandstay': {'fc': '#AA7777', 'ec': '#BBBBBB', 'lw': 0, 'hatch': '###...',  'zorder': 0}
-            }
-    )
-    amen = map_out(fig_to_img(plt))
-    amen.append_mark("Amen")
-    return amen
-
-def createNegativeStreets(dimy):
+def createNegativeStreets(dimy, source=None):
     ''' Create a map of Paris with just the routes.
     Args:
         dimy (int) : the width and height of the map
-    Returns: The name of the file created as string'''
+        source : the path to the geometries to draw from, surveyed if not given
+    Returns: The map as a map_out'''
+    return sketch('Ngtv_streets', dimy, source)
 
-    # Init matplotlib figure
-    fig, ax = plt.subplots(figsize = (dimy, dimy), constrained_layout = True)
-
-    layers = plot(
-        # Address:
-        map_location,
-        # Plot geometries in a circle of radius:
-        radius = map_radius,
-        # Matplotlib axis
-        ax = ax,
-        # Which OpenStreetMap layers to plot and their parameters:
-        layers = {
-                # Perimeter (in this case, a circle)
-                'perimeter': {},
-                # Streets and their widths
-                'streets': {
-                    'width': {
-                        'motorway': 5,
-                        'trunk': 5,
-                        'primary': 4.5,
-                        'secondary': 4,
-                        'tertiary': 3.5,
-                        'residential': 3,
-                        'service': 2,
-                        'unclassified': 2,
-                        'pedestrian': 2,
-                        'footway': 1,
-                    }
-                },
-                # Other layers:
-                #   Specify a name (for example, 'building') and which OpenStreetMap tags to fetch
-                'building': {'tags': {'building': True, 'landuse': 'construction'}, 'union': False},
-            },
-            # drawing_kwargs:
-            #   Reference a name previously defined in the 'layers' argument and specify matplotlib parameters to draw it
-            drawing_kwargs = {
-                'background': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'hatch': 'ooo...', 'zorder': -1},
-                'perimeter': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
-                'streets': {'fc': '#000000', 'ec': '#000000', 'alpha': 1, 'lw': 0, 'zorder': 3},
-                'building': {'palette': ['#AAAAAA', '#AAAAAA', '#AAAAAA'], 'ec': '#AAAAAA', 'lw': .5, 'zorder': 4},
-            }
-    )
-
-    ngtv = map_out(fig_to_img(plt))
-    ngtv.append_mark("Ngtv_streets")
-    return ngtv
-
-def createNegativeBuildings(dimy):
+def createNegativeBuildings(dimy, source=None):
     ''' Create a map of Paris with just the buildings.
     Args:
         dimy (int) : the width and height of the map
-    Returns: The name of the file created as string'''
-
-    # Init matplotlib figure
-    fig, ax = plt.subplots(figsize = (dimy, dimy), constrained_layout = True)
-
-    layers = plot(
-        # Address:
-        map_location,
-        # Plot geometries in a circle of radius:
-        radius = map_radius,
-        # Matplotlib axis
-        ax = ax,
-        # Which OpenStreetMap layers to plot and their parameters:
-        layers = {
-                # Perimeter (in this case, a circle)
-                'perimeter': {},
-                # Streets and their widths
-                'streets': {
-                    'width': {
-                        'motorway': 5,
-                        'trunk': 5,
-                        'primary': 4.5,
-                        'secondary': 4,
-                        'tertiary': 3.5,
-                        'residential': 3,
-                        'service': 2,
-                        'unclassified': 2,
-                        'pedestrian': 2,
-                        'footway': 1,
-                    }
-                },
-                # Other layers:
-                #   Specify a name (for example, 'building') and which OpenStreetMap tags to fetch
-                'building': {'tags': {'building': True, 'landuse': 'construction'}, 'union': False},
-            },
-            # drawing_kwargs:
-            #   Reference a name previously defined in the 'layers' argument and specify matplotlib parameters to draw it
-            drawing_kwargs = {
-                'background': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'hatch': 'ooo...', 'zorder': -1},
-                'perimeter': {'fc': '#FFFFFF', 'ec': '#FFFFFF', 'lw': 0, 'hatch': 'ooo...',  'zorder': 0},
-                'streets': {'fc': '#AAAAAA', 'ec': '#AAAAAA', 'alpha': 1, 'lw': 0, 'zorder': 3},
-                'building': {'palette': ['#000000', '#000000', '#000000'], 'ec': '#000000', 'lw': .5, 'zorder': 4},
-            }
-    )
-
-    ngtv = map_out(fig_to_img(plt))
-    ngtv.append_mark("Ngtv_buildings")
-    return ngtv
+        source : the path to the geometries to draw from, surveyed if not given
+    Returns: The map as a map_out'''
+    return sketch('Ngtv_buildings', dimy, source)
+
+#------------- WINDOWED RENDERING ----------------
+def extent(drawn):
+    '''The bounds of the perimeter prettymaps drew, in its projected coordinates.
+    Returns: (minx, miny, maxx, maxy)'''
+    perimeter = drawn['perimeter']
+    return tuple(perimeter.total_bounds if hasattr(perimeter, 'total_bounds') else perimeter.bounds)
+
+def window(job):
+    '''Draws one tile-aligned window of a map in a worker process and writes it straight to its final form.
+    Args: job as a tuple of (style, name, size in pixels, (x0, y0, x1, y1) window in pixels, steps, .npy, tiled, source)
+        If tiled the window is cut into level 0 tiles and shrunk into the .npy of level 1,
+        otherwise the window is written into the .npy as it is.
+    Returns: a dictionary of the tile names and their hashes, for the manifest.'''
+    style, name, size, (x0, y0, x1, y1), steps, dst, tiled, source = job
+    dpi = 100
+    fig = plt.figure(figsize = ((x1 - x0) / dpi, (y1 - y0) / dpi), dpi = dpi)
+    ax = fig.add_axes([0, 0, 1, 1])
+    fig.patch.set_facecolor(styles[style][1].get('background', {}).get('fc', '#FFFFFF'))
+    minx, miny, maxx, maxy = extent(draw(style, ax, source))
+
+    #The whole map is size pixels square, so show just the part of it under this window.
+    sx, sy = (maxx - minx) / size, (maxy - miny) / size
+    ax.set_xlim(minx + x0 * sx, minx + x1 * sx)
+    ax.set_ylim(maxy - y1 * sy, maxy - y0 * sy)
+    ax.set_aspect('auto')
+    ax.axis('off')
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba())[:y1 - y0, :x1 - x0]
+    plt.close(fig)
+    pixels = darkroom.expose(pixels, 0, len(pixels), steps)
+
+    hashes = {}
+    if not tiled:
+        out = np.load(dst, mmap_mode='r+')
+        out[y0:y1, x0:x1] = pixels
+        out.flush()
+        return hashes
+
+    tw, th = sizzors.tile_size
+    for y in range(0, y1 - y0, th):
+        for x in range(0, x1 - x0, tw):
+            tile = f"{name}_{(y0 + y) // th}_{(x0 + x) // tw}.png"
+            hashes[tile], _ = sizzors.cut(pixels[y:y + th, x:x + tw, :3], '../tiles', tile, {})
+    small = np.load(dst, mmap_mode='r+')
+    sizzors.shrink(np.ascontiguousarray(pixels[..., :3]), small[:, x0 // 2:], y0 // 2)
+    small.flush()
+    return hashes
+
+def render(style, name, dimy, steps=(), tiled=True, region=4, workers=None, source=None):
+    '''Renders a map a window at a time across processes, so it is never held whole by anything.
+    Each window is a block of tiles, drawn from the same layers and drawing_kwargs as createMara and friends.
+    Args:
+        style : the key of the style in styles to draw.
+        name : the name of the map, for its tiles or its .npy.
+        dimy (int) : the width and height of the map in inches, at 100 pixels an inch.
+        steps : a list of (name, *args) filters from darkroom.KERNELS to run over each window.
+        tiled : True to cut the map into the tile pyramid in ../tiles for the camera,
+            False to write it into {name}.npy, ready to be memory mapped like a heatmap.
+        region : how many tiles wide and high each window is.
+        workers : how many processes to use, all the cores by default.
+        source : the path to the geometries to draw from, surveyed if not given.'''
+    #Survey here, so the workers only ever read the cache.
+    source = survey(source)
+    size = dimy * 100
+    span = sizzors.tile_size[0] * region
+    boxes = [(x, y, min(x + span, size), min(y + span, size)) for y in range(0, size, span) for x in range(0, size, span)]
+
+    if tiled:
+        os.makedirs('../tiles', exist_ok=True)
+        dst = f"{name}_1.npy"
+        np.lib.format.open_memmap(dst, mode='w+', dtype=np.uint8, shape=((size + 1) // 2, (size + 1) // 2, 3)).flush()
+    else:
+        #Work out what the filters turn a pixel into, such as gray flattening it to one channel.
+        probe = darkroom.expose(np.zeros((1, 1, 4), np.uint8), 0, 1, steps)
+        dst = f"{name}.npy.part"
+        np.lib.format.open_memmap(dst, mode='w+', dtype=probe.dtype, shape=(size, size) + probe.shape[2:]).flush()
+
+    known = {}
+    with ProcessPoolExecutor(workers) as pool:
+        for hashes in pool.map(window, [(style, name, size, box, list(steps), dst, tiled, source) for box in boxes]):
+            known.update(hashes)
+    print(f"Rendered {name} in {len(boxes)} windows")
+
+    if tiled:
+        with open('../tiles/manifest.json', 'w') as f:
+            json.dump(known, f, indent=1)
+        #Every tile of level 0 was just written again, so a pack of the old ones can't be trusted.
+        sizzors.unpack()
+        #The windows have already shrunk themselves into level 1, so the rest of the pyramid comes from there.
+        sizzors.stack(dst, name, 1, workers)
+        os.remove(dst)
+    else:
+        #Swap it in whole, so a half rendered file is never mistaken for a heatmap.
+        os.replace(dst, f"{name}.npy")
 
 def sepiaMap(mp):
     ''' A sepia filter.
     Args:
         mp (map_out) : map_out to apply filter to
     Returns: The same map_out with a sepia filter'''
-
-    # create the pixel array
-    width, height = mp.img.size
-    pixels = mp.img.load() 
-
-    for py in range(height):
-        print('sepia -> ',py)
-        for px in range(width):
-            r, g, b, a = mp.img.getpixel((px, py))
-
-            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-
-            if tr > 255:
-                tr = 255
-
-            if tg > 255:
-                tg = 255
-
-            if tb > 255:
-                tb = 255
-
-            pixels[px, py] = (tr,tg,tb, a)
-
-    return mp.append_mark('sepia')
+    return mp.dip('sepia').append_mark('sepia')
 
 def invertMap(mp):
     ''' Create a negative of a png.
     Args:
         mp (map_out) : the map_out to invert
     Returns: the same map_out inverted'''
-    mp.img = ImageOps.invert(mp.img)
-    return mp.append_mark('invert')
+    return mp.dip('invert').append_mark('invert')
 
 def grayscale(mp):
     ''' Create a grayscale version of a png.
     Args:
         mp (map_out) : the map_out to flatten
     Returns: the same map_out as a grayscale'''
-    mp.img = ImageOps.grayscale(mp.img)
-    return mp.append_mark('gray')
+    return mp.dip('gray').append_mark('gray')
         
 
 def blurMap(mp, radius):
-    ''' A gaussian blur filter.
+    ''' A box blur filter.
     Args:
         mp (map_out) : the path to the map_out to apply filter
+        radius : the radius of the box
     Returns: the same map_out blurred'''
-    mp.img = mp.img.filter(ImageFilter.BoxBlur(radius))
-    return mp.append_mark('blur')
+    return mp.dip('blur', radius).append_mark('blur')
 
 def flipMap(mp):
-    mp.img = mp.img.transpose(Image.FLIP_LEFT_RIGHT)
-    return mp.append_mark('flip')
+    return mp.dip('flip').append_mark('flip')
+
+def defaults(windowed=False, fixture=None):
+    '''Generates the map tiles and both heatmaps main.py needs, from one survey of the geometries.
+    Args:
+        windowed : True to render them a window at a time across processes, rather than as whole figures.
+        fixture : the path to a cache of geometries to render from offline.'''
+    source = survey(fixture)
+    if windowed:
+        render('Mara', 'Mara', 230, source = source)
+        render('Ngtv_streets', 'heatmap_roads', 230, [('gray',), ('invert',)], tiled = False, source = source)
+        render('Ngtv_buildings', 'heatmap_buildings', 230, [('gray',), ('invert',)], tiled = False, source = source)
+        return
 
-def defaults():
     #Generate Main Map
-    main_map = createMara(230)
+    main_map = createMara(230, source)
     main_map.name = 'Mara'
     main_map.todisk()
+    #A raw copy lets sizzors.py read the map a strip at a time.
+    main_map.vinegar()
 
     #Generate Both Negative for Path Following
-    street_map = invertMap(grayscale(createNegativeStreets(230)))
+    street_map = invertMap(grayscale(createNegativeStreets(230, source)))
     street_map.name = 'heatmap_roads'
     street_map.todisk()
     street_map.vinegar()
-    build_map = invertMap(grayscale(createNegativeBuildings(230)))
+    build_map = invertMap(grayscale(createNegativeBuildings(230, source)))
     build_map.name = 'heatmap_buildings'
     build_map.todisk()
     build_map.vinegar()
 
 if __name__ == "__main__":
     try:
-        defaults()
+        fixture = sys.argv[sys.argv.index('--fixture') + 1] if '--fixture' in sys.argv else None
+        defaults(windowed = '--windowed' in sys.argv, fixture = fixture)
     except ValueError:
         print("Exiting Runtime due to ValueError!")
 
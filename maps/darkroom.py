@@ -0,0 +1,141 @@
+import math
+import os
+import struct
+import zlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+#------------- FILTERS ----------------
+#Each filter works on a strip of rows as a numpy array, so a map is never needed whole.
+
+def sepia(strip):
+    '''A sepia filter, keeping any alpha channel.'''
+    tone = np.array([[0.393, 0.769, 0.189],
+                     [0.349, 0.686, 0.168],
+                     [0.272, 0.534, 0.131]])
+    out = strip.copy()
+    out[..., :3] = np.minimum(np.floor(strip[..., :3] @ tone.T), 255)
+    return out
+
+def invert(strip):
+    '''A negative, keeping any alpha channel.'''
+    out = strip.copy()
+    if out.ndim == 2:
+        return 255 - out
+    out[..., :3] = 255 - out[..., :3]
+    return out
+
+def gray(strip):
+    '''Flattens to a single channel with the same weights as PIL.'''
+    if strip.ndim == 2:
+        return strip
+    r, g, b = (strip[..., k].astype(np.uint32) for k in range(3))
+    return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+def flip(strip):
+    '''Mirrors left to right.'''
+    return np.ascontiguousarray(strip[:, ::-1])
+
+def blur(strip, radius):
+    '''A box blur like PIL's BoxBlur: a horizontal then a vertical pass, extending the edge pixels.'''
+    return box(box(strip, radius, 1), radius, 0)
+
+def box(strip, radius, axis):
+    '''One pass of a box blur of a (possibly fractional) radius along an axis.'''
+    ri = int(radius)
+    frac = radius - ri
+    n = strip.shape[axis]
+    pad = [(0, 0)] * strip.ndim
+    pad[axis] = (ri + 2, ri + 1)
+    total = np.cumsum(np.pad(strip.astype(np.float64), pad, mode='edge'), axis=axis)
+    take = lambda a, b: np.take(total, np.arange(a, a + n), axis=axis) - np.take(total, np.arange(b, b + n), axis=axis)
+    #Everything within the radius, then the fraction of the pixels just beyond it.
+    inner = take(ri * 2 + 2, 1)
+    outer = take(ri * 2 + 3, ri * 2 + 2) + take(1, 0)
+    return np.rint((inner + frac * outer) / (radius * 2 + 1)).astype(np.uint8)
+
+#name : (filter, how many rows above and below a strip it needs to see)
+KERNELS = {
+    'sepia': (sepia, lambda: 0),
+    'invert': (invert, lambda: 0),
+    'gray': (gray, lambda: 0),
+    'flip': (flip, lambda: 0),
+    'blur': (blur, lambda radius: int(math.ceil(radius)) + 1),
+}
+
+#------------- DEVELOPING ----------------
+def expose(src, top, bottom, steps):
+    '''Runs a chain of filters over rows top to bottom of a map, reading just enough rows around them.
+    Args:
+        src : the map as a numpy array or memmap.
+        top, bottom : the rows to develop.
+        steps : a list of (name, *args) tuples from KERNELS.
+    Returns: the developed rows as a numpy array.'''
+    halo = sum(KERNELS[step[0]][1](*step[1:]) for step in steps)
+    a, b = max(0, top - halo), min(len(src), bottom + halo)
+    strip = np.asarray(src[a:b])
+    for step in steps:
+        strip = KERNELS[step[0]][0](strip, *step[1:])
+    return strip[top - a:bottom - a]
+
+def proof(src, steps):
+    '''Works out the shape and dtype a chain of filters will develop a map into.'''
+    probe = expose(src, 0, 1, steps)
+    return (len(src),) + probe.shape[1:], probe.dtype
+
+def bath(job):
+    '''Develops one strip of a .npy into another .npy, for a worker process.'''
+    src, dst, top, bottom, steps = job
+    out = np.load(dst, mmap_mode='r+')
+    out[top:bottom] = expose(np.load(src, mmap_mode='r'), top, bottom, steps)
+    out.flush()
+
+def develop(src, dst, steps, workers=None, strip=920):
+    '''Streams a map from one .npy to another through a chain of filters, a strip at a time across processes.
+    Args:
+        src, dst : the paths to the .npy files.
+        steps : a list of (name, *args) tuples from KERNELS.
+        workers : how many processes to use, all the cores by default.
+        strip : how many rows each process develops at once.'''
+    shape, dtype = proof(np.load(src, mmap_mode='r'), steps)
+    np.lib.format.open_memmap(f'{dst}.part', mode='w+', dtype=dtype, shape=shape).flush()
+    jobs = [(src, f'{dst}.part', top, min(top + strip, shape[0]), steps) for top in range(0, shape[0], strip)]
+    with ProcessPoolExecutor(workers) as pool:
+        list(pool.map(bath, jobs))
+    os.replace(f'{dst}.part', dst)
+
+def develop_array(src, steps, workers=None, strip=920):
+    '''Runs a chain of filters over a map already in memory, a strip at a time across threads.
+    Returns: the developed map as a numpy array.'''
+    shape, dtype = proof(src, steps)
+    out = np.empty(shape, dtype)
+    def work(top):
+        out[top:top + strip] = expose(src, top, min(top + strip, shape[0]), steps)
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(work, range(0, shape[0], strip)))
+    return out
+
+def topng(src, dst, strip=920):
+    '''Encodes a .npy map as a png a strip at a time, so it is never held in memory whole.'''
+    img = np.load(src, mmap_mode='r')
+    h, w = img.shape[:2]
+    c = 1 if img.ndim == 2 else img.shape[2]
+
+    def chunk(f, kind, data):
+        f.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data)))
+
+    with open(f'{dst}.part', 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        chunk(f, b'IHDR', struct.pack('>IIBBBBB', w, h, 8, {1: 0, 2: 4, 3: 2, 4: 6}[c], 0, 0, 0))
+        z = zlib.compressobj(6)
+        for top in range(0, h, strip):
+            rows = np.asarray(img[top:top + strip]).reshape(-1, w * c)
+            #Each row is written with the Sub filter: the difference to the pixel on its left.
+            sub = rows.copy()
+            sub[:, c:] -= rows[:, :-c]
+            data = z.compress(np.hstack([np.ones((len(rows), 1), np.uint8), sub]).tobytes())
+            if data:
+                chunk(f, b'IDAT', data)
+        chunk(f, b'IDAT', z.flush())
+        chunk(f, b'IEND', b'')
+    os.replace(f'{dst}.part', dst)
@@ -0,0 +1,52 @@
+import cv2
+import json
+import os
+import struct
+import zlib
+
+#The pack starts with a magic number, then the offset and length of its json index, then the pixel blocks.
+MAGIC = b'PARISPK1'
+HEADER = struct.Struct('<8sQQ')
+ALIGN = 4096
+
+def pyramid(folder):
+    '''Lists the folders of each level of the tile pyramid, as written by sizzors.py'''
+    levels = [(0, folder)]
+    while os.path.isdir(os.path.join(folder, str(len(levels)))):
+        levels.append((len(levels), os.path.join(folder, str(len(levels)))))
+    return levels
+
+def pack_it(folder='../tiles', out='../tiles/tiles.pack', compress=False):
+    '''Packs every tile of the pyramid into one file of raw RGB pixel blocks, which main.py can memory map
+    and turn into surfaces without decoding a png.
+    Args:
+        folder : the folder of tiles written by sizzors.py.
+        out : the pack to write.
+        compress : lightly zlib the blocks, trading a little cpu for a much smaller file.'''
+    index = {}
+    with open(f'{out}.part', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        for level, path in pyramid(folder):
+            for tile in sorted(os.listdir(path)):
+                if not tile.endswith('.png'):
+                    continue
+                pic_split = tile.replace('.png', '').split('_')
+                img = cv2.imread(os.path.join(path, tile))
+                block = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).tobytes()
+                if compress:
+                    block = zlib.compress(block, 1)
+                #Line each block up with a page, so mapping one tile touches as few pages as possible.
+                f.seek(-f.tell() % ALIGN, os.SEEK_CUR)
+                index[f"{level}_{pic_split[-2]}_{pic_split[-1]}"] = [f.tell(), len(block), img.shape[1], img.shape[0],
+                                                                     'zlib' if compress else 'raw']
+                f.write(block)
+        table = json.dumps(index).encode()
+        offset = f.tell()
+        f.write(table)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, offset, len(table)))
+    os.replace(f'{out}.part', out)
+    print(f"Packed {len(index)} tiles into {out}")
+
+if __name__ == '__main__':
+    pack_it()
@@ -1,19 +1,142 @@
 import cv2
+import hashlib
+import json
 import math
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
-def tile_it(file):
-    
-    img = cv2.imread(f'{file}.png')
+#----------- GLOBALS ------------------
+tile_size = (920, 920)
+#--------------------------------------
 
-    img_shape = img.shape
-    tile_size = (920, 920)
-    offset = (920, 920)
 
-    for i in range(int(math.ceil(img_shape[0]/(offset[1] * 1.0)))):
-        for j in range(int(math.ceil(img_shape[1]/(offset[0] * 1.0)))):
-            cropped_img = img[offset[1]*i:min(offset[1]*i+tile_size[1], img_shape[0]), offset[0]*j:min(offset[0]*j+tile_size[0], img_shape[1])]
-            # Debugging the tiles
-            cv2.imwrite(f"../tiles/{file}_{i}_{j}.png", cropped_img)
+def source(file, tile_size=tile_size):
+    '''Finds the map as a memory mappable .npy of RGB(A) pixels, as written by map_out.vinegar.
+    A map we only have as a png is converted once, which is the only time it is held in memory whole,
+    and again whenever the png is newer than the .npy, so an edited map reaches the tiles.
+    Returns: the path to the .npy'''
+    png, npy = f'{file}.png', f'{file}.npy'
+    if not os.path.exists(npy) or (os.path.exists(png) and os.path.getmtime(png) > os.path.getmtime(npy)):
+        print(f"Converting {file}.png to {file}.npy. This only happens when the png changes.")
+        img = cv2.imread(f'{file}.png')
+        out = np.lib.format.open_memmap(f'{file}.npy.part', mode='w+', dtype=img.dtype, shape=img.shape)
+        for y in range(0, img.shape[0], tile_size[1]):
+            out[y:y + tile_size[1]] = img[y:y + tile_size[1], :, ::-1]
+        out.flush()
+        del out, img
+        os.replace(f'{file}.npy.part', f'{file}.npy')
+    return f'{file}.npy'
+
+def unpack(folder='../tiles'):
+    '''Deletes the tile pack written by packer.py, as main.py would prefer its stale copy of a tile to a fresh png.'''
+    pack = f'{folder}/tiles.pack'
+    if os.path.exists(pack):
+        os.remove(pack)
+        print(f"Removed {pack} as the tiles have changed. Run packer.py again to pack them.")
+
+def cut(tile, folder, name, known):
+    '''Writes one tile as a png, unless the manifest says its pixels haven't changed.
+    Args:
+        tile : the RGB pixels of the tile as a numpy array.
+        folder, name : where to write it.
+        known : a dictionary of tile names and their hashes from the manifest.
+    Returns: the tile's hash, and whether it was written.'''
+    #cv2 wants BGR.
+    tile = np.ascontiguousarray(tile[:, :, 2::-1])
+    digest = hashlib.blake2b(tile.tobytes() + str(tile.shape).encode(), digest_size=16).hexdigest()
+    if known.get(name) != digest or not os.path.exists(f"{folder}/{name}"):
+        cv2.imwrite(f"{folder}/{name}", tile)
+        return digest, True
+    return digest, False
+
+def shrink(strip, small, top):
+    '''Halves a strip of a map into the next level of the pyramid, with its top edge at row top of the next level.'''
+    size = ((strip.shape[1] + 1) // 2, (strip.shape[0] + 1) // 2)
+    small[top:top + size[1], :size[0]] = cv2.resize(strip, size, interpolation=cv2.INTER_AREA)
+
+def snip(job):
+    '''Cuts one horizontal strip of a map into tiles, writing only the tiles whose pixels have changed.
+    If there is a next level of the pyramid, the strip is also shrunk into it.
+    Args: job as a tuple of (source .npy, file, folder, row, tile_size, known hashes, next level .npy or None)
+    Returns: a dictionary of the strip's tile names and their hashes, and how many tiles were written.'''
+    src, file, folder, row, tile_size, known, nxt = job
+    img = np.load(src, mmap_mode='r')
+    tw, th = tile_size
+    strip = np.ascontiguousarray(img[th*row:th*(row+1), :, :3])
+
+    hashes = {}
+    written = 0
+    for col in range(int(math.ceil(strip.shape[1] / tw))):
+        name = f"{file}_{row}_{col}.png"
+        hashes[name], fresh = cut(strip[:, tw*col:tw*(col+1)], folder, name, known)
+        written += fresh
+
+    if nxt:
+        small = np.load(nxt, mmap_mode='r+')
+        shrink(strip, small, th//2*row)
+        small.flush()
+    return hashes, written
+
+def tile_it(file, workers=None):
+    '''Slices a map into a pyramid of tiles.
+    Level 0 is the map at full size in ../tiles, and each level after is half the size of the one before,
+    in ../tiles/1, ../tiles/2 and so on, until the whole map fits in one tile.
+    The map is read a strip of tiles at a time, the strips are spread over a pool of processes,
+    and a manifest of tile hashes in each folder means a rerun only rewrites the tiles that changed.
+    Args:
+        file : the name of the map, without the extension.
+        workers : how many processes to use, all the cores by default.'''
+    stack(source(file, tile_size), file, 0, workers)
+
+def stack(src, file, level=0, workers=None):
+    '''Slices a .npy map into the tiles of one level of the pyramid, then every smaller level after it.
+    Args:
+        src : the path to the .npy of the map at this level.
+        file : the name of the map, for the tile names.
+        level : which level of the pyramid src is.
+        workers : how many processes to use, all the cores by default.'''
+    shrunk = []
+    changed = 0
+    folder = '../tiles' if level == 0 else f'../tiles/{level}'
+    with ProcessPoolExecutor(workers) as pool:
+        while True:
+            os.makedirs(folder, exist_ok=True)
+            shape = np.load(src, mmap_mode='r').shape
+            last = shape[0] <= tile_size[1] and shape[1] <= tile_size[0]
+
+            #The next level is built up strip by strip while we cut this one.
+            nxt = None
+            if not last:
+                nxt = f'{file}_{level + 1}.npy'
+                np.lib.format.open_memmap(nxt, mode='w+', dtype=np.uint8,
+                                          shape=((shape[0] + 1) // 2, (shape[1] + 1) // 2, 3)).flush()
+                shrunk.append(nxt)
+
+            manifest = f'{folder}/manifest.json'
+            known = json.load(open(manifest)) if os.path.exists(manifest) else {}
+            rows = int(math.ceil(shape[0] / tile_size[1]))
+            jobs = [(src, file, folder, row, tile_size,
+                     {k: v for k, v in known.items() if k.startswith(f"{file}_{row}_")}, nxt) for row in range(rows)]
+            written = 0
+            for hashes, count in pool.map(snip, jobs):
+                known.update(hashes)
+                written += count
+            with open(manifest, 'w') as f:
+                json.dump(known, f, indent=1)
+            print(f"Level {level} -> {folder} : {written} tiles written, {len(known) - written} unchanged")
+            changed += written
+
+            if last:
+                break
+            src = nxt
+            level += 1
+            folder = f'../tiles/{level}'
+
+    for path in shrunk:
+        os.remove(path)
+    if changed:
+        unpack()
 
 if __name__ == '__main__':
     tile_it('Mara')
@@ -1,13 +1,37 @@
+import os
 import pickle
+import numpy as np
 from PIL import Image
 from numpy import asarray
 Image.MAX_IMAGE_PIXELS = 529000000 + 1
 
+def brine(arr, name):
+    '''Writes a map as a raw .npy binary that can be memory mapped.
+    The .npy header records the dims, layers and dtype, so nothing else needs to be read to open it.
+    Args:
+        arr : the map as a numpy array.
+        name : the path to write to, without the extension.'''
+    #Write to the side and swap it in, so a half written file is never mistaken for a heatmap.
+    with open(f"{name}.npy.part", "wb") as f:
+        np.save(f, np.ascontiguousarray(arr))
+    os.replace(f"{name}.npy.part", f"{name}.npy")
+
+def uncork(name):
+    '''Opens a brined map as a read-only memmap, so pages are read on demand and shared between processes.
+    If only an old pickle exists, it is converted first.
+    Args: name as the path to the map, without the extension.
+    Returns: the map as a numpy memmap.'''
+    if not os.path.exists(f"{name}.npy") and os.path.exists(f"{name}.b"):
+        print(f"Converting {name}.b to {name}.npy. This only happens once.")
+        with open(f"{name}.b", "rb") as f:
+            brine(pickle.load(f), name)
+    return np.load(f"{name}.npy", mmap_mode="r")
+
 def vinegar():
-    '''Pickles a map as binary'''
-    pickle.dump(asarray(Image.open('heatmap_buildings.png')), open(f"heatmap_buildings.b", "wb"))
-    pickle.dump(asarray(Image.open('heatmap_roads.png')), open(f"heatmap_roads.b", "wb"))
+    '''Brines the heatmaps as memory mappable binaries'''
+    brine(asarray(Image.open('heatmap_buildings.png')), "heatmap_buildings")
+    brine(asarray(Image.open('heatmap_roads.png')), "heatmap_roads")
 
 if __name__ == "__main__":
 	vinegar()
-	exit()
\ No newline at end of file
+	exit()
@@ -0,0 +1,69 @@
+#--------------------- IMPORTS ---------------------
+import itertools
+import math
+
+#--------------------- OBJECTS ---------------------
+class quartier:
+    def __init__(self, cell=512):
+        '''A uniform grid over the map that buckets sprites by where they are, so we can ask who is near the camera
+        without looking at everyone. Sprites are only moved between buckets when they cross into a new cell.
+        Args: cell as the width and height of each cell in pixels of the map.'''
+        self.cell = cell
+        self.cells = {}
+        #sprite : (cell, the order it was first placed in)
+        self.where = {}
+        self.count = itertools.count()
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, sprite):
+        return sprite in self.where
+
+    def place(self, sprite, pos):
+        '''Put a sprite in the cell under a position, moving it out of its old one if it has crossed over.
+        Args:
+            sprite : any hashable, usually a pygame sprite.
+            pos : its co-ordinates on the map.'''
+        key = (math.floor(pos[0] / self.cell), math.floor(pos[1] / self.cell))
+        old = self.where.get(sprite)
+        if old is not None:
+            if old[0] == key:
+                return
+            self.evict(sprite, old[0])
+            order = old[1]
+        else:
+            order = next(self.count)
+        self.cells.setdefault(key, set()).add(sprite)
+        self.where[sprite] = (key, order)
+
+    def remove(self, sprite):
+        '''Take a sprite out of the grid, if it is in there.'''
+        old = self.where.pop(sprite, None)
+        if old is not None:
+            self.evict(sprite, old[0])
+
+    def evict(self, sprite, key):
+        bucket = self.cells[key]
+        bucket.discard(sprite)
+        if not bucket:
+            del self.cells[key]
+
+    def query(self, rect):
+        '''Find the sprites in every cell that touches a rectangle of the map.
+        Args: rect as (left, top, right, bottom) co-ordinates on the map.
+        Returns: a list of sprites, in the order they were first placed, so drawing them is stable.'''
+        x0, y0 = math.floor(rect[0] / self.cell), math.floor(rect[1] / self.cell)
+        x1, y1 = math.floor(rect[2] / self.cell), math.floor(rect[3] / self.cell)
+        found = []
+        #Zoomed right out the rectangle covers more cells than are occupied, so walk whichever is fewer.
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            for (x, y), bucket in self.cells.items():
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    found.extend(bucket)
+        else:
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    found.extend(self.cells.get((x, y), ()))
+        found.sort(key=lambda sprite: self.where[sprite][1])
+        return found
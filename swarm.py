@@ -0,0 +1,326 @@
+#--------------------- IMPORTS ---------------------
+import math
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+#--------------------- GLOBALS ---------------------
+#How many uniform floats each swarm keeps in its pool of dice, 4MB of them.
+POOL = 2**20
+
+#--------------------- FUNCTIONS ---------------------
+def mix(z):
+    '''The splitmix64 finaliser: scrambles a uint64 array so nearby inputs give unrelated outputs.'''
+    z = z + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+#--------------------- OBJECTS ---------------------
+class lightcone:
+    def __init__(self, budget=16 * 2**20, folder=None):
+        '''A bank of h_cost kernels, one for every theta a parisian of a given radius can hold.
+        Args:
+            budget : the most bytes the bank may hold. A radius whose kernels won't fit is computed on the fly.
+            folder : an optional directory to load banks from and save them to.'''
+        self.budget = budget
+        self.folder = folder
+        self.banks = OrderedDict()
+
+    def __call__(self, r, th):
+        '''Looks up the h_cost for each velocity vector.
+        Args:
+            r : The radius of the array.
+            th : a (k, 2) array of velocity vectors.
+        Returns: a (k, 2r+1, 2r+1) array weighted towards each velocity vector.'''
+        bank = self.bank(r)
+        if bank is None:
+            return self.sculpt(r, th)
+        #A theta from before the radius shrank falls outside the bank, so sculpt those few.
+        stray = np.any(np.abs(th) > r, axis=1)
+        if not np.any(stray):
+            return bank[th[:, 0] + r, th[:, 1] + r]
+        h_cost = np.empty((len(th), r * 2 + 1, r * 2 + 1), bank.dtype)
+        h_cost[~stray] = bank[th[~stray, 0] + r, th[~stray, 1] + r]
+        h_cost[stray] = self.sculpt(r, th[stray])
+        return h_cost
+
+    def bank(self, r):
+        '''Gets the kernels for radius r, building or loading them if we haven't yet.
+        Returns: a (2r+1, 2r+1, 2r+1, 2r+1) array indexed by theta + r, or None if it won't fit the budget.'''
+        if r in self.banks:
+            self.banks.move_to_end(r)
+            return self.banks[r]
+        w = r * 2 + 1
+        dtype = np.min_scalar_type(math.ceil(r * 3 * math.sqrt(2)))
+        if w ** 4 * dtype.itemsize > self.budget:
+            return None
+
+        path = os.path.join(self.folder, f"lightcone_{r}.npy") if self.folder else None
+        if path and os.path.exists(path):
+            bank = np.load(path)
+        else:
+            th = np.stack(np.meshgrid(np.arange(w) - r, np.arange(w) - r, indexing='ij'), axis=-1).reshape(-1, 2)
+            bank = self.sculpt(r, th).astype(dtype).reshape(w, w, w, w)
+            if path:
+                np.save(path, bank)
+
+        #Make room by forgetting the radius we used longest ago.
+        self.banks[r] = bank
+        while sum(b.nbytes for b in self.banks.values()) > self.budget:
+            self.banks.popitem(last=False)
+        return bank
+
+    def sculpt(self, r, th):
+        '''Computes the h_cost lightcone for each velocity vector from scratch.'''
+        a = np.arange(r * 2 + 1) - r
+        h_cost = (th[:, 0, None, None] * 2 + a[:, None]) ** 2 + (th[:, 1, None, None] * 2 + a[None, :]) ** 2
+        return np.floor(np.sqrt(h_cost)).astype(np.int32)
+
+class swarm:
+    def __init__(self, roads, buildings, radius=15, watch=50, seed=None, cones=None):
+        '''Holds the walking state of every parisian in numpy arrays so they can all path-find at once.
+        Args:
+            roads, buildings : the heatmaps as 2d numpy arrays, indexed [y, x].
+            radius : how far each parisian can see and move each calculation.
+            watch : how many frames between each movement.
+            seed : seed for the random generator so a walk can be replayed.
+            cones : the lightcone bank serving h_costs, shared between swarms if you like.'''
+        self.heatmaps = (roads, buildings)
+        self.dim = roads.shape[:2]
+        self.cones = cones if cones is not None else lightcone()
+        self.radius = radius
+        self.watch = watch
+        self.rng = np.random.default_rng(seed)
+        #The dice each parisian rolls while walking are hashed from this key, who they are and the tick,
+        #so a walk is the same however the parisians are split up between processes.
+        self.key = np.random.SeedSequence(seed).generate_state(1, np.uint64)
+        #The pool of dice, and the key it was drawn from.
+        self.pool = None
+        self.pooled = None
+        self.clock = 0
+        #How many parisians path-find on each tick of the watch, so we can keep them even.
+        self.slots = np.zeros(watch, np.int64)
+        #Only the first active parisians walk, or everyone if None.
+        self.active = None
+        self.agents = []
+        self.position = np.zeros((0, 2), np.int64)
+        self.theta = np.zeros((0, 2), np.int64)
+        self.laptime = np.zeros(0, np.int64)
+        self.transitioning = np.zeros(0, bool)
+        self.inside = np.zeros(0, bool)
+        self.dextra = np.zeros(0, bool)
+        self.due = np.zeros(0, np.intp)
+        self.sight = np.zeros((0, radius * 2 + 1, radius * 2 + 1))
+
+    @property
+    def radius(self):
+        return self._radius
+
+    @radius.setter
+    def radius(self, r):
+        '''Change how far everyone can see, warming up the lightcones for the new radius.'''
+        self._radius = r
+        self.cones.bank(r)
+
+    def __len__(self):
+        return len(self.agents)
+
+    def live(self):
+        '''How many parisians are walking, counting from the first enlisted.'''
+        n = len(self.agents)
+        return n if self.active is None else min(self.active, n)
+
+    def enlist(self, agent, pos, time):
+        '''Give a parisian a row in the swarm's arrays.
+        Args:
+            agent : the parisian sprite that will read back its results.
+            pos : its x & y co-ordinates from the origin of the heatmap.
+            time : a seed for its internal clock, so the swarm walks out of phase.
+                If that tick of the watch is busier than another, we take the next quietest one instead.
+        Returns: the index of the parisian in the swarm.'''
+        idx = len(self.agents)
+        #Double the arrays when we run out of room so enlisting stays cheap.
+        if idx == len(self.laptime):
+            self.grow(max(64, idx * 2))
+        r = self.radius
+        self.position[idx] = pos
+        self.theta[idx] = self.rng.integers(-r, r + 1, size=2)
+        self.laptime[idx] = self.slot(time % self.watch)
+        self.transitioning[idx] = self.rng.random() < 0.2
+        self.inside[idx] = False
+        self.dextra[idx] = self.rng.random() < 0.5
+        self.agents.append(agent)
+        return idx
+
+    def slot(self, wish):
+        '''Picks which tick of the watch a new parisian path-finds on, so every tick carries the same load.
+        Args: wish as the tick they would like.
+        Returns: the quietest tick, the wished for one or the first after it if there is a tie.'''
+        quiet = np.flatnonzero(self.slots == self.slots.min())
+        after = quiet[quiet >= wish]
+        slot = int(after[0] if len(after) else quiet[0])
+        self.slots[slot] += 1
+        #A slot is a parisian's laptime when the swarm's clock was at 0, so move it on by however far the clock has.
+        return (slot + self.clock) % self.watch
+
+    def grow(self, size):
+        '''Resize every state array to hold size parisians, keeping the ones we have.'''
+        for key in ('position', 'theta', 'laptime', 'transitioning', 'inside', 'dextra'):
+            old = getattr(self, key)
+            new = np.zeros((size,) + old.shape[1:], old.dtype)
+            new[:len(old)] = old
+            setattr(self, key, new)
+
+    def update(self):
+        '''Spin everyone's internal clock.'''
+        n = len(self.agents)
+        self.laptime[:n] = (self.laptime[:n] + 1) % self.watch
+        self.clock += 1
+
+    def close(self):
+        '''Nothing to let go of when everyone walks in this process.'''
+
+    def noise(self, idx, salt, shape=()):
+        '''Rolls dice for some parisians this tick, the same dice whoever rolls them, in any order.
+        Args:
+            idx : index array of the parisians rolling.
+            salt : which roll this is, so two rolls in one tick differ.
+            shape : how many dice each parisian rolls.
+        Returns: a (len(idx), *shape) array of random uint64.'''
+        #Each parisian's dice are a splitmix64 hash of the key, who they are, the tick, the roll and the die.
+        with np.errstate(over='ignore'):
+            base = mix(mix(mix(self.key + np.asarray(idx, np.uint64)) + np.uint64(self.clock)) + np.uint64(salt))
+            dice = np.arange(math.prod(shape), dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+            return mix(base[:, None] + dice).reshape((len(base),) + tuple(shape))
+
+    def uniform(self, idx, salt, shape=()):
+        '''Like noise, but floats in [0, 1).'''
+        return (self.noise(idx, salt, shape) >> np.uint64(11)) * 2.0 ** -53
+
+    def dice(self, idx, salt, shape):
+        '''Rolls a window of dice for some parisians this tick, the same dice whoever rolls them, in any order.
+        Hashing every die is slow, so each parisian only hashes where to start reading from a pool of
+        uniform floats drawn once from the key, and reads the window from there.
+        Args: as noise.
+        Returns: a (len(idx), *shape) array of float32 in [0, 1).'''
+        seed = int(self.key[0])
+        if self.pooled != seed:
+            self.pool = np.random.default_rng(seed).random(POOL, np.float32)
+            self.pooled = seed
+        size = math.prod(shape)
+        start = (self.noise(idx, salt) % np.uint64(POOL - size + 1)).astype(np.intp)
+        return self.pool[start[:, None] + np.arange(size)].reshape((len(start),) + tuple(shape))
+
+    def petrify(self, among=None):
+        '''Checks which parisians are due to move and which of those should be standing still.
+        Args: among as an index array of the parisians to check, everyone by default.
+        Returns: (due, walkers) as index arrays. due are all parisians whose clock is at 0,
+        walkers are the due parisians that are not inside a building.'''
+        if among is None:
+            due = np.flatnonzero(self.laptime[:self.live()] == 0)
+        else:
+            due = among[self.laptime[among] == 0]
+
+        #Roll a biased dice to see who starts or stops transitioning between roads and buildings.
+        odds = np.where(self.transitioning[due], 1 / 500, 1 / 2500)
+        flip = due[self.uniform(due, 0) < odds]
+        self.transitioning[flip] = ~self.transitioning[flip]
+        self.inside[flip] = False
+
+        #Transitioning parisians stop once their local radius is all building.
+        look = due[self.transitioning[due] & ~self.inside[due]]
+        if len(look):
+            g = self.aspare(look, math.ceil(self.radius / 10))
+            self.inside[look] = ~np.any(g < 250, axis=(1, 2))
+        self.inside[due[~self.transitioning[due]]] = False
+
+        self.due = due
+        return due, due[~self.inside[due]]
+
+    def path_find(self, walkers):
+        '''Every walker checks their surrounding area and steps to the brightest pixel.
+        Args: walkers as an index array of the parisians to move.
+        Returns: a (len(walkers), 2r+1, 2r+1) array, a heatmap of each walker's prefered future position.'''
+
+        #r is our radius, how far can they see in front of them.
+        r = self.radius
+        k = len(walkers)
+        if not k:
+            return self.sight[:0]
+
+        #Generate some randomness to give the path some surprises.
+        rand_weight = math.floor(r * 10)
+        rand_cost = (self.dice(walkers, 1, (r * 2 + 1, r * 2 + 1)) * rand_weight).astype(np.int32)
+
+        #Streets and buildings are higher numbers than non-passable areas.
+        g_cost = self.aspare(walkers, r)
+
+        #h_cost is our current direction.
+        #This is to give the path some bias to keep going straight and at a constant speed.
+        h_cost = self.poursuivre(r, self.theta[walkers])
+
+        #f_cost is a compotion of all of the above to create organic movment.
+        f_cost = self.normalize(rand_cost + h_cost, 127) + g_cost
+
+        #apply a little bit of noise so no two values are the same.
+        scale = f_cost.std(axis=(1, 2)) * 0.01
+        f_cost = f_cost + self.dice(walkers, 2, f_cost.shape[1:]) * scale[:, None, None]
+        self.sight = f_cost
+
+        #Get the index of the largest number in each sight, relative to the walker in the centre.
+        pathdex = np.unravel_index(f_cost.reshape(k, -1).argmax(axis=1), f_cost.shape[1:])
+        pathdex = np.stack(pathdex, axis=1) - r
+
+        #Step, face the direction we stepped in, and swap which foot we are on.
+        self.position[walkers] += pathdex
+        self.theta[walkers] = pathdex
+        self.dextra[walkers] = ~self.dextra[walkers]
+        return f_cost
+
+    def poursuivre(self, r, th):
+        '''Generates a h_cost with a lightcone biasing towards each current direction.
+        Args:
+            r : The radius of the array.
+            th : a (k, 2) array of velocity vectors.
+        Returns: a (k, 2r+1, 2r+1) array weighted towards each velocity vector.'''
+        return self.cones(r, th)
+
+    def aspare(self, idx, r):
+        '''Generates a g_cost where high values responding to building and streets.
+        Args:
+            idx : index array of the parisians to look around.
+            r : The radius of the window.
+        Returns: a (len(idx), 2r+1, 2r+1) array indexed [k, x, y], zero beyond the border of the heatmap.'''
+        reach = np.arange(-r, r + 1)
+        xs = self.position[idx, 0, None] + reach
+        ys = self.position[idx, 1, None] + reach
+        x_out = (xs < 0) | (xs >= self.dim[1])
+        y_out = (ys < 0) | (ys >= self.dim[0])
+        xs = np.clip(xs, 0, self.dim[1] - 1)
+        ys = np.clip(ys, 0, self.dim[0] - 1)
+
+        #One gather per heatmap, for everyone on it.
+        g_cost = np.empty((len(idx), r * 2 + 1, r * 2 + 1), np.int32)
+        layer = self.transitioning[idx]
+        for sel, heatmap in enumerate(self.heatmaps):
+            k = np.flatnonzero(layer == sel)
+            if len(k):
+                g_cost[k] = heatmap[ys[k, None, :], xs[k, :, None]]
+
+        #If we are near a border, pad with nothing and turn around.
+        g_cost[x_out[:, :, None] | y_out[:, None, :]] = 0
+        bounce = np.any(x_out, axis=1) ^ np.any(y_out, axis=1)
+        self.theta[idx[bounce]] *= -1
+        return g_cost
+
+    def normalize(self, np_arr, ub):
+        '''This function normalises each window of a stack to be within the specified upperbound.
+        Args:
+            np_arr : (k, w, w) numpy array to be normalised.
+            ub : the upper bound of the normalised output.
+        Returns: a normalised numpy array.'''
+        np_arr = np_arr.astype('float64')
+        np_arr *= ub / np.maximum(np_arr.max(axis=(1, 2), keepdims=True), 1)
+        return np_arr.astype(np.int32)
@@ -0,0 +1,249 @@
+#--------------------- IMPORTS ---------------------
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import pygame
+
+#--------------------- OBJECTS ---------------------
+class tilepack:
+    def __init__(self, path):
+        '''A single file of raw tile pixels written by maps/packer.py, memory mapped so a tile needs no decoding.
+        Args: path as the path to the pack.'''
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, offset, length = struct.unpack_from('<8sQQ', self.map, 0)
+        if magic != b'PARISPK1':
+            raise ValueError(f"{path} is not a tile pack")
+        self.index = {}
+        for key, entry in json.loads(self.map[offset:offset + length]).items():
+            level, row, col = (int(k) for k in key.split('_'))
+            self.index[(level, row, col)] = entry
+
+    def __contains__(self, rc):
+        return rc in self.index
+
+    def load(self, rc):
+        '''Build a surface straight from the mapped pixels of a tile.
+        Args: rc as the (level, row, col) of the tile.
+        Returns: a pygame surface, not yet converted for the display.'''
+        offset, length, w, h, codec = self.index[rc]
+        block = memoryview(self.map)[offset:offset + length]
+        if codec == 'zlib':
+            block = zlib.decompress(block)
+        return pygame.image.frombuffer(block, (w, h), 'RGB')
+
+class tileset:
+    def __init__(self, folder='tiles', budget=128 * 2**20, pack='tiles.pack'):
+        '''An index of the tiles on disk and a least-recently-used cache of the decoded ones.
+        Args:
+            folder : the folder of tiles written by sizzors.py, named {map}_{row}_{col}.png.
+                Each downsampled level of the pyramid is in a numbered subfolder, tiles/1, tiles/2 and so on.
+            budget : the most bytes of decoded surfaces to keep, across every level.
+            pack : the name of a tile pack in the folder to load tiles from, with the pngs as a fallback.'''
+        self.folder = folder
+        self.budget = budget
+        #Parse the filenames once, so finding a tile is a dictionary lookup keyed on (level, row, col).
+        self.index = {}
+        self.levels = 1
+        for level, path in self.pyramid():
+            for tile in os.listdir(path):
+                if tile.endswith('.png'):
+                    pic_split = tile.replace('.png', '').split('_')
+                    self.index[(level, int(pic_split[-2]), int(pic_split[-1]))] = os.path.join(path, tile)
+            self.levels = level + 1
+        self.pack = None
+        if pack and os.path.exists(os.path.join(folder, pack)):
+            self.pack = tilepack(os.path.join(folder, pack))
+            for rc in self.pack.index:
+                self.index.setdefault(rc, None)
+            self.levels = max(self.levels, max(rc[0] for rc in self.pack.index) + 1)
+        self.surfaces = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def pyramid(self):
+        '''Lists the folders of each level of the pyramid, stopping at the first missing level.
+        Returns: a list of (level, folder) tuples.'''
+        levels = [(0, self.folder)]
+        while os.path.isdir(os.path.join(self.folder, str(len(levels)))):
+            levels.append((len(levels), os.path.join(self.folder, str(len(levels)))))
+        return levels
+
+    def __contains__(self, rc):
+        return rc in self.index
+
+    def get(self, rc):
+        '''Get the surface of a tile, decoding it if it isn't cached.
+        Args: rc as the (level, row, col) of the tile.
+        Returns: a pygame surface, or None if there is no such tile.'''
+        if rc in self.surfaces:
+            self.hits += 1
+            self.surfaces.move_to_end(rc)
+            return self.surfaces[rc]
+        if rc not in self.index:
+            return None
+        self.misses += 1
+        surf = self.decode(rc).convert()
+        self.put(rc, surf)
+        return surf
+
+    def decode(self, rc):
+        '''Read a tile from the pack if it is in there, otherwise decode its png.
+        Returns: a pygame surface, not yet converted for the display.'''
+        if self.pack and rc in self.pack:
+            return self.pack.load(rc)
+        return pygame.image.load(self.index[rc])
+
+    def peek(self, rc):
+        '''Get the surface of a tile only if it is already cached.
+        Args: rc as the (level, row, col) of the tile.
+        Returns: a pygame surface, or None if it hasn't been decoded.'''
+        if rc in self.surfaces:
+            self.hits += 1
+            self.surfaces.move_to_end(rc)
+            return self.surfaces[rc]
+        return None
+
+    def put(self, rc, surf):
+        '''Cache a decoded tile, evicting the least recently used ones to stay within budget.'''
+        if rc in self.surfaces:
+            self.nbytes -= self.weigh(self.surfaces.pop(rc))
+        self.surfaces[rc] = surf
+        self.nbytes += self.weigh(surf)
+        while self.nbytes > self.budget and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.nbytes -= self.weigh(old)
+            self.evictions += 1
+
+    def weigh(self, surf):
+        '''How many bytes a surface holds.'''
+        return surf.get_pitch() * surf.get_height()
+
+    def report(self):
+        '''Returns: the cache counters as a dictionary.'''
+        return {'tiles': len(self.surfaces), 'mb': round(self.nbytes / 2**20, 1),
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+class prefetcher:
+    def __init__(self, tileset, workers=2, lookahead=30, spares=8):
+        '''A pool of threads that decode tiles off the main thread, ahead of where the camera is heading.
+        Args:
+            tileset : the tileset to decode tiles for.
+            workers : how many decoding threads to run.
+            lookahead : how many frames ahead to predict the camera.
+            spares : how many decoded tiles we gave up on to keep unconverted, in case the camera turns back.'''
+        self.tileset = tileset
+        self.lookahead = lookahead
+        self.spares = spares
+        self.requests = queue.PriorityQueue()
+        self.ready = queue.Queue()
+        #rc : [priority, count] of the one request for each tile that still counts, until it is received.
+        self.pending = {}
+        #The tiles a thread has started on, so asking for them again doesn't decode them twice.
+        self.decoding = set()
+        #Decoded tiles waiting to be converted, most needed first.
+        self.arrived = {}
+        #Decoded tiles nobody wants any more, the most recently given up on last.
+        self.spare = OrderedDict()
+        self.lock = threading.Lock()
+        self.count = 0
+        self.threads = [threading.Thread(target=self.work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def work(self):
+        '''Decode requested tiles into the hand-off queue until we are told to stop.'''
+        while True:
+            _, count, rc = self.requests.get()
+            if rc is None:
+                return
+            #A tile bumped up the queue is in there twice, and one we gave up on is still in there,
+            #so only decode the request that still counts.
+            with self.lock:
+                if self.pending.get(rc, [None, None])[1] != count or rc in self.decoding:
+                    continue
+                self.decoding.add(rc)
+            self.ready.put((rc, self.tileset.decode(rc)))
+
+    def request(self, rcs, priority=1):
+        '''Ask for tiles to be decoded, unless they are cached or on their way.
+        Args:
+            rcs : the (level, row, col) of each tile.
+            priority : 0 for tiles needed now, 1 for tiles we expect to need.'''
+        with self.lock:
+            for rc in rcs:
+                if rc not in self.tileset.index or rc in self.tileset.surfaces:
+                    continue
+                if rc not in self.pending:
+                    self.tileset.misses += 1
+                elif self.pending[rc][0] <= priority:
+                    continue
+                elif rc in self.decoding or rc in self.arrived:
+                    #It is already on its way, it only has to jump the queue to be converted.
+                    self.pending[rc][0] = priority
+                    continue
+                self.count += 1
+                self.pending[rc] = [priority, self.count]
+                if rc in self.spare:
+                    self.arrived[rc] = self.spare.pop(rc)
+                else:
+                    self.requests.put((priority, self.count, rc))
+
+    def cancel(self, keep):
+        '''Give up on every tile asked for that isn't in keep, as the camera has gone another way.
+        Tiles already decoded are kept spare rather than converted, in case the camera turns back.
+        Args: keep as the (level, row, col) of each tile still worth having.'''
+        with self.lock:
+            for rc in [rc for rc in self.pending if rc not in keep]:
+                del self.pending[rc]
+                if rc in self.arrived:
+                    self.keep(rc, self.arrived.pop(rc))
+
+    def keep(self, rc, surf):
+        '''Keep a decoded tile nobody wants any more, forgetting the oldest beyond spares.'''
+        self.spare[rc] = surf
+        while len(self.spare) > self.spares:
+            self.spare.popitem(last=False)
+
+    def receive(self, budget=0.004):
+        '''Convert decoded tiles for the display and cache them, on the main thread, within a time budget.
+        Args: budget as the seconds we can spend this frame.'''
+        start = time.perf_counter()
+        with self.lock:
+            while True:
+                try:
+                    rc, surf = self.ready.get_nowait()
+                except queue.Empty:
+                    break
+                self.decoding.discard(rc)
+                #Anything we gave up on while it was decoding isn't worth converting yet.
+                if rc in self.pending:
+                    self.arrived[rc] = surf
+                else:
+                    self.keep(rc, surf)
+            #The tiles needed now are converted first, then the ones we expect to need.
+            order = sorted(self.arrived, key=lambda rc: self.pending[rc])
+        for rc in order:
+            if time.perf_counter() - start >= budget:
+                return
+            with self.lock:
+                surf = self.arrived.pop(rc, None)
+                if surf is None:
+                    continue
+                del self.pending[rc]
+            self.tileset.put(rc, surf.convert())
+
+    def stop(self):
+        '''Let the decoding threads finish.'''
+        for _ in self.threads:
+            self.count += 1
+            self.requests.put((-1, self.count, None))
@@ -0,0 +1,114 @@
+#--------------------- IMPORTS ---------------------
+import math
+from collections import deque
+
+import pygame
+import numpy as np
+
+#--------------------- OBJECTS ---------------------
+class trail(pygame.sprite.DirtySprite):
+    def __init__(self, size, margin=200, fade=0.99, cutoff=0.15, every=4):
+        '''A layer that footprints are stamped into and faded all at once, instead of a ghost per footprint.
+        Args:
+            size : the width and height of the camera.
+            margin : how far beyond the camera footprints are kept.
+            fade : how much of each footprint is kept each frame, like ghost.dispart.
+            cutoff : how faded a footprint is before it vanishes, like ghost.end_self.
+            every : how many frames between each fade.'''
+        pygame.sprite.DirtySprite.__init__(self)
+        self.margin = margin
+        self.every = every
+        self.laptime = 0
+        self.drift = (0., 0.)
+        self.image = pygame.Surface((size[0] + margin * 2, size[1] + margin * 2), pygame.SRCALPHA)
+        self.image.fill((0, 0, 0, 0))
+        self.rect = self.image.get_rect(topleft=(-margin, -margin))
+
+        #Fading is one lookup over every byte, so the cost doesn't grow with the number of footprints.
+        #Like dispart, the colour fades along with the alpha.
+        keep = np.arange(256) * fade ** every
+        self.lut = np.where(keep < cutoff * 255, 0, np.floor(keep)).astype(np.uint8)
+
+        #Where each footprint was stamped and when, for as long as it takes to fade away,
+        #so we can tell which parts of the screen a fade has touched.
+        self.frame = 0
+        self.lifetime = (math.ceil(math.log(cutoff) / (every * math.log(fade))) + 1) * every
+        self.marks = deque()
+        self.changed = []
+
+    def stamp(self, image, position):
+        '''Press a footprint into the layer.
+        Args:
+            image : the footprint as a pygame surface.
+            position : where it is centred, relative to the camera.'''
+        rect = image.get_rect(center=(position[0] + self.margin, position[1] + self.margin))
+        self.image.blit(image, rect, special_flags=pygame.BLEND_RGBA_MAX)
+        rect = rect.clip(self.image.get_rect())
+        self.marks.append((rect, self.frame))
+        self.changed.append(rect)
+
+    def scroll(self, dx, dy):
+        '''When the map moves, this function ensures the footprints move with it'''
+        #When zoomed out the map moves by fractions of a pixel, so keep the remainder for next time.
+        self.drift = (self.drift[0] + dx, self.drift[1] + dy)
+        dx, dy = int(self.drift[0]), int(self.drift[1])
+        self.drift = (self.drift[0] - dx, self.drift[1] - dy)
+        if not (dx or dy):
+            return
+        w, h = self.image.get_size()
+        self.image.scroll(dx, dy)
+        #Whatever scrolled in from off the layer is stale, so clear it.
+        if dx:
+            self.image.fill((0, 0, 0, 0), (0 if dx > 0 else w + dx, 0, abs(dx), h))
+        if dy:
+            self.image.fill((0, 0, 0, 0), (0, 0 if dy > 0 else h + dy, w, abs(dy)))
+        self.marks = deque((rect.move(dx, dy), frame) for rect, frame in self.marks)
+        self.changed = [self.image.get_rect()]
+
+    def adopt(self, pixels):
+        '''Take over a layer of footprints, from a snapshot.
+        Args: pixels as a (height, width, 4) array of RGBA, the size of the layer.'''
+        pygame.surfarray.pixels3d(self.image)[...] = pixels[..., :3].swapaxes(0, 1)
+        pygame.surfarray.pixels_alpha(self.image)[...] = pixels[..., 3].T
+        #We don't know where each footprint is any more, so watch the whole layer until they have all faded.
+        self.marks.append((self.image.get_rect(), self.frame))
+        self.changed = [self.image.get_rect()]
+
+    def pixels(self):
+        '''The layer as a (height, width, 4) array of RGBA, for a snapshot.'''
+        w, h = self.image.get_size()
+        return np.frombuffer(pygame.image.tobytes(self.image, 'RGBA'), np.uint8).reshape(h, w, 4)
+
+    def clear(self):
+        '''Sweep away every footprint.'''
+        self.image.fill((0, 0, 0, 0))
+        self.drift = (0., 0.)
+        self.marks.clear()
+        self.changed = [self.image.get_rect()]
+
+    def update(self):
+        '''Fade one band of the layer, so every row is faded once every few frames at an even cost per frame.'''
+        w, h = self.image.get_size()
+        top, bottom = h * self.laptime // self.every, h * (self.laptime + 1) // self.every
+        pixdata = np.frombuffer(self.image.get_buffer(), np.uint8).reshape(h, -1)[top:bottom]
+        np.take(self.lut, pixdata, out=pixdata)
+        del pixdata
+        self.laptime = (self.laptime + 1) % self.every
+
+        #Only the footprints in the band have changed, and the oldest ones have faded away entirely.
+        band = pygame.Rect(0, top, w, bottom - top)
+        self.changed.extend(rect.clip(band) for rect, _ in self.marks if rect.colliderect(band))
+        self.frame += 1
+        while self.marks and self.frame - self.marks[0][1] > self.lifetime:
+            self.marks.popleft()
+
+    def changes(self):
+        '''Which parts of the screen the footprints have changed since we last asked.
+        Returns: a list of rects relative to the camera.'''
+        changed = [rect.move(-self.margin, -self.margin) for rect in self.changed]
+        self.changed = []
+        return changed
+
+    def draw(self, surface):
+        surface.blit(self.image, self.rect)
+        self.changed = []